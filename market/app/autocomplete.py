@@ -0,0 +1,177 @@
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from heapq import merge
+from itertools import islice
+
+from django.db.models import F
+from django.utils import timezone
+
+from app.models import Category, Product, ProductInfo, CatalogVersion
+
+WORD_RE = re.compile(r'\w+')
+
+# Порядок типов подсказок в выдаче
+SUGGESTION_TYPES = ('category', 'product', 'model')
+
+
+def split_words(text):
+    return WORD_RE.findall(text.lower().replace('ё', 'е'))
+
+
+def get_catalog_version():
+    return CatalogVersion.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+
+
+def bump_catalog_version():
+    """
+    Отметка изменения каталога, вызывается в транзакции импорта
+
+    Строку версии создает миграция 0013, поэтому достаточно UPDATE:
+    параллельные импорты не соревнуются за ее создание.
+    """
+    CatalogVersion.objects.filter(pk=1).update(version=F('version') + 1, updated_at=timezone.now())
+
+
+def contains(posting, number):
+    position = bisect_left(posting, number)
+    return position < len(posting) and posting[position] == number
+
+
+def merge_unique(postings):
+    """
+    Объединение отсортированных массивов номеров без повторов, по возрастанию
+    """
+    last = None
+    for number in merge(*postings):
+        if number != last:
+            yield number
+            last = number
+
+
+class PrefixIndex:
+    """
+    Индекс подсказок в памяти процесса
+
+    Подсказки (тип, id, текст) упорядочены по типу и длине текста, их номер
+    служит рангом. Слова всех подсказок хранятся отсортированным списком,
+    для каждого слова - массив номеров подсказок по возрастанию. Префикс
+    слова находится двоичным поиском по списку слов. Для коротких префиксов,
+    под которые попадает большая часть словаря, лучшие подсказки считаются
+    заранее.
+    """
+    short_prefix = 2
+    max_results = 50
+    # Сколько слов префикса проверяется по массивам номеров, а не по тексту подсказки
+    prefix_words = 64
+
+    def __init__(self, suggestions):
+        unique = {}
+        for kind, object_id, text in suggestions:
+            unique.setdefault((kind, text), object_id)
+        self.suggestions = sorted(((kind, object_id, text) for (kind, text), object_id in unique.items()),
+                                  key=lambda item: (SUGGESTION_TYPES.index(item[0]), len(item[2]), item[2]))
+
+        postings = defaultdict(list)
+        top = defaultdict(list)
+        for number, (_, _, text) in enumerate(self.suggestions):
+            for word in dict.fromkeys(split_words(text)):
+                postings[word].append(number)
+                for length in range(1, self.short_prefix + 1):
+                    numbers = top[word[:length]]
+                    if len(numbers) < self.max_results and (not numbers or numbers[-1] != number):
+                        numbers.append(number)
+        self.words = sorted(postings)
+        self.postings = [array('I', postings[word]) for word in self.words]
+        self.top = {prefix: array('I', numbers) for prefix, numbers in top.items()}
+
+    def __len__(self):
+        return len(self.suggestions)
+
+    def prefix_range(self, prefix):
+        start = bisect_left(self.words, prefix)
+        return start, bisect_left(self.words, prefix + '\uffff', start)
+
+    def search(self, text, limit=10):
+        """
+        Подсказки, содержащие все слова текста; последнее слово - префикс
+        """
+        words = split_words(text)
+        if not words:
+            return []
+        *complete, prefix = words
+
+        postings = []
+        for word in complete:
+            position = bisect_left(self.words, word)
+            if position == len(self.words) or self.words[position] != word:
+                return []
+            postings.append(self.postings[position])
+
+        start, end = self.prefix_range(prefix)
+        if start == end:
+            return []
+        prefix_postings = self.postings[start:end]
+
+        if not postings:
+            if prefix in self.top and limit <= self.max_results:
+                return [self.suggestions[number] for number in self.top[prefix][:limit]]
+            found = islice(merge_unique(prefix_postings), limit)
+            return [self.suggestions[number] for number in found]
+
+        # Номера со всеми полными словами, затем проверка префикса по порядку ранга
+        if len(postings) == 1:
+            candidates = postings[0]
+        else:
+            postings.sort(key=len)
+            candidates = sorted(set(postings[0]).intersection(*postings[1:]))
+
+        if end - start <= self.prefix_words:
+            def has_prefix(number):
+                return any(contains(posting, number) for posting in prefix_postings)
+        else:
+            def has_prefix(number):
+                return any(word.startswith(prefix) for word in split_words(self.suggestions[number][2]))
+
+        found = islice((number for number in candidates if has_prefix(number)), limit)
+        return [self.suggestions[number] for number in found]
+
+
+def build_index():
+    """
+    Индекс по названиям категорий и товаров и моделям предложений
+    """
+    def suggestions():
+        for category_id, name in Category.objects.order_by('id').values_list('id', 'name').iterator():
+            yield 'category', category_id, name
+        for product_id, name in Product.objects.order_by('id').values_list('id', 'name').iterator():
+            yield 'product', product_id, name
+        for model in ProductInfo.objects.exclude(model='').values_list('model', flat=True).distinct().iterator():
+            yield 'model', None, model
+
+    return PrefixIndex(suggestions())
+
+
+# Индекс процесса и версия каталога, по которой он построен
+index_state = {'index': None, 'version': None}
+index_lock = threading.Lock()
+
+
+def get_index():
+    """
+    Индекс текущей версии каталога, после импорта он строится заново
+    """
+    version = get_catalog_version()
+    if index_state['version'] != version:
+        with index_lock:
+            if index_state['version'] != version:
+                index_state['index'] = build_index()
+                index_state['version'] = version
+    return index_state['index']
+
+
+def autocomplete(text, limit=10):
+    return [{'type': kind, 'id': object_id, 'text': suggestion}
+            for kind, object_id, suggestion in get_index().search(text, limit)]
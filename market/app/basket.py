@@ -0,0 +1,274 @@
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Case, When, Value, PositiveIntegerField, Count, ExpressionWrapper, F, Sum
+from django.db.models.functions import Coalesce
+
+from app.catalog import refresh_catalog
+from app.models import ProductInfo, Order, OrderItem
+from app.offers import refresh_best_offers
+from app.parsers import BATCH_SIZE
+
+# Поколение сводок корзин в кэше: его смена делает недействительными сводки всех пользователей
+SUMMARY_GENERATION_KEY = 'basket-summary-generation'
+
+
+def summary_cache():
+    return caches[settings.BASKET_SUMMARY_CACHE]
+
+
+def summary_key(user_id):
+    return f'basket-summary:{user_id}'
+
+
+def get_generation():
+    """
+    Текущее поколение сводок, при отсутствии в кэше - новое
+    """
+    generation = summary_cache().get(SUMMARY_GENERATION_KEY)
+    if generation is None:
+        summary_cache().add(SUMMARY_GENERATION_KEY, uuid4().hex, None)
+        generation = summary_cache().get(SUMMARY_GENERATION_KEY)
+    return generation
+
+
+def basket_lines(user_id):
+    return OrderItem.objects.filter(order__user_id=user_id, order__state='basket')
+
+
+def line_sum():
+    """
+    Стоимость позиции в SQL: количество на цену предложения
+    """
+    return ExpressionWrapper(F('quantity') * F('product_info__price'), output_field=PositiveIntegerField())
+
+
+def count_summary(user_id, generation=None):
+    """
+    Сводка корзины одним запросом с сохранением в кэш
+
+    Сводка сохраняется вместе с поколением, прочитанным до запроса к БД:
+    если поколение за это время сменилось, сохраненная сводка не будет использована.
+    """
+    if generation is None:
+        generation = get_generation()
+    summary = basket_lines(user_id).aggregate(
+        lines=Count('id'),
+        total_quantity=Coalesce(Sum('quantity'), 0),
+        total_sum=Coalesce(Sum(line_sum()), 0),
+    )
+    summary_cache().set(summary_key(user_id), (generation, summary), settings.BASKET_SUMMARY_TIMEOUT)
+    return summary
+
+
+def get_summary(user_id):
+    """
+    Сводка корзины: число позиций, количество товаров и сумма
+
+    Поколение и сводка читаются из кэша одним get_many; запрос к БД
+    выполняется только при промахе или если сводка старого поколения.
+    """
+    key = summary_key(user_id)
+    cached = summary_cache().get_many([SUMMARY_GENERATION_KEY, key])
+    generation = cached.get(SUMMARY_GENERATION_KEY)
+    if generation is not None and key in cached and cached[key][0] == generation:
+        return cached[key][1]
+    return count_summary(user_id, generation)
+
+
+def invalidate_summary(user_id):
+    """
+    Сброс сводки корзины пользователя после фиксации изменившей ее транзакции
+    """
+    transaction.on_commit(lambda: summary_cache().delete(summary_key(user_id)))
+
+
+def invalidate_summaries():
+    """
+    Сброс сводок всех корзин, например после изменения цен или удаления предложений
+    """
+    transaction.on_commit(lambda: summary_cache().set(SUMMARY_GENERATION_KEY, uuid4().hex, None))
+
+
+def parse_quantity(value):
+    """
+    Целое положительное число из числа или строки, иначе None
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, str) and value.isdigit():
+        value = int(value)
+    return value if isinstance(value, int) and value > 0 else None
+
+
+def parse_items(items):
+    """
+    Позиции запроса: id предложения -> количество и ошибки по номерам позиций
+
+    Повторяющиеся предложения складываются.
+    """
+    lines, errors = {}, {}
+    if not isinstance(items, list):
+        return lines, {'items': 'Ожидается список позиций'}
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or 'product_info' not in item or 'quantity' not in item:
+            errors[index] = 'Укажите product_info и quantity'
+            continue
+        product_info, quantity = parse_quantity(item['product_info']), parse_quantity(item['quantity'])
+        if product_info is None:
+            errors[index] = 'product_info должен быть id предложения'
+        elif quantity is None:
+            errors[index] = 'quantity должно быть целым положительным числом'
+        else:
+            lines[product_info] = lines.get(product_info, 0) + quantity
+    return lines, errors
+
+
+def add_items(user_id, items):
+    """
+    Добавление позиций в корзину пользователя, возвращает ошибки по позициям
+
+    Все позиции проверяются сразу: предложения и их остатки выбираются одним
+    запросом, уже лежащие в корзине позиции - другим. Корзина берется (или
+    создается) с блокировкой до чтения позиций: у пользователя одна корзина
+    (unique_user_basket), поэтому одновременные добавления выполняются по
+    очереди и видят позиции друг друга. Если есть ошибки, транзакция
+    откатывается, и корзина не меняется (и не создается). Иначе количество
+    существующих позиций увеличивается через bulk_update, новые позиции
+    создаются через bulk_create.
+    """
+    lines, errors = parse_items(items)
+    if not isinstance(items, list) or not items:
+        return errors or {'items': 'Нет позиций для добавления'}
+
+    with transaction.atomic():
+        stock = dict(ProductInfo.objects.filter(id__in=lines).values_list('id', 'quantity'))
+        basket, _ = Order.objects.select_for_update().get_or_create(user_id=user_id, state='basket')
+        existing = {item.product_info_id: item
+                    for item in OrderItem.objects.filter(order=basket, product_info_id__in=lines)}
+
+        for index, item in enumerate(items):
+            if index in errors:
+                continue
+            product_info = parse_quantity(item['product_info'])
+            if product_info not in stock:
+                errors[index] = 'Предложение не найдено'
+                continue
+            quantity = lines[product_info] + (existing[product_info].quantity if product_info in existing else 0)
+            if quantity > stock[product_info]:
+                errors[index] = f'Недостаточно товара: в наличии {stock[product_info]}, в корзине {quantity}'
+        if errors:
+            transaction.set_rollback(True)
+            return dict(sorted(errors.items()))
+
+        for product_info, item in existing.items():
+            item.quantity += lines[product_info]
+        OrderItem.objects.bulk_update(existing.values(), ['quantity'], batch_size=BATCH_SIZE)
+        OrderItem.objects.bulk_create([OrderItem(order=basket, product_info_id=product_info, quantity=quantity)
+                                       for product_info, quantity in lines.items() if product_info not in existing],
+                                      batch_size=BATCH_SIZE)
+        invalidate_summary(user_id)
+    return {}
+
+
+def update_items(user_id, items):
+    """
+    Новое количество позиций корзины: (измененные id предложений, отклоненные позиции)
+
+    Позиции корзины и остатки выбираются двумя запросами, количество всех
+    подходящих позиций меняется одним UPDATE с CASE WHEN на пакет.
+    """
+    quantities, sources, rejected = {}, {}, []
+    for item in items:
+        product_info = parse_quantity(item.get('product_info')) if isinstance(item, dict) else None
+        quantity = parse_quantity(item.get('quantity')) if isinstance(item, dict) else None
+        if product_info is None or quantity is None:
+            rejected.append({'item': item, 'Error': 'Укажите id предложения product_info и количество quantity'})
+        else:
+            quantities[product_info] = quantity
+            sources[product_info] = item
+
+    with transaction.atomic():
+        lines = dict(basket_lines(user_id).filter(product_info_id__in=quantities).values_list('product_info_id', 'id'))
+        stock = dict(ProductInfo.objects.filter(id__in=lines).values_list('id', 'quantity'))
+
+        updated = {}
+        for product_info, quantity in quantities.items():
+            if product_info not in lines:
+                rejected.append({'item': sources[product_info], 'Error': 'Товара нет в корзине'})
+            elif quantity > stock[product_info]:
+                rejected.append({'item': sources[product_info],
+                                 'Error': f'Недостаточно товара: в наличии {stock[product_info]}'})
+            else:
+                updated[lines[product_info]] = quantity
+
+        line_ids = list(updated)
+        for start in range(0, len(line_ids), BATCH_SIZE):
+            batch = line_ids[start:start + BATCH_SIZE]
+            OrderItem.objects.filter(id__in=batch).update(quantity=Case(
+                *[When(id=line_id, then=Value(updated[line_id])) for line_id in batch],
+                output_field=PositiveIntegerField(),
+            ))
+        if updated:
+            invalidate_summary(user_id)
+
+    return [product_info for product_info in quantities if lines.get(product_info) in updated], rejected
+
+
+def delete_items(user_id, item_ids):
+    """
+    Удаление позиций корзины по id: (удаленные id, ошибки по id)
+
+    Позиции корзины пользователя находятся одним запросом и удаляются одним DELETE.
+    """
+    with transaction.atomic():
+        found = set(basket_lines(user_id).filter(id__in=item_ids).values_list('id', flat=True))
+        OrderItem.objects.filter(id__in=found).delete()
+        if found:
+            invalidate_summary(user_id)
+
+    deleted = [item_id for item_id in dict.fromkeys(item_ids) if item_id in found]
+    return deleted, {item_id: 'Позиция не найдена в корзине' for item_id in item_ids if item_id not in found}
+
+
+def place_order(basket_id, contact_id):
+    """
+    Размещение заказа из корзины с резервированием остатков, возвращает ошибки
+
+    Первый запрос транзакции переводит корзину в статус new (только если она
+    еще корзина), затем остаток каждой позиции уменьшается условным UPDATE
+    quantity = quantity - n WHERE quantity >= n в порядке id предложений,
+    чтобы параллельные заказы блокировали строки в одном порядке. Если
+    какого-то товара не хватило, транзакция откатывается целиком и корзина
+    остается корзиной. Для затронутых товаров пересчитываются лучшие
+    предложения и записи каталога.
+    """
+    with transaction.atomic():
+        if not Order.objects.filter(id=basket_id, state='basket').update(state='new', contact_id=contact_id):
+            return {'order': 'Корзина уже оформлена'}
+
+        lines = list(OrderItem.objects.filter(order_id=basket_id).order_by('product_info_id')
+                     .values_list('product_info_id', 'quantity'))
+        if not lines:
+            transaction.set_rollback(True)
+            return {'order': 'Корзина пуста'}
+
+        shortage = [(product_info, quantity) for product_info, quantity in lines
+                    if not ProductInfo.objects.filter(id=product_info, quantity__gte=quantity)
+                    .update(quantity=F('quantity') - quantity)]
+        if shortage:
+            transaction.set_rollback(True)
+        else:
+            product_ids = set(ProductInfo.objects.filter(id__in=[product_info for product_info, _ in lines])
+                              .values_list('product_id', flat=True))
+            refresh_best_offers(product_ids)
+            refresh_catalog(product_ids)
+
+    if not shortage:
+        return {}
+    stock = dict(ProductInfo.objects.filter(id__in=[product_info for product_info, _ in shortage])
+                 .values_list('id', 'quantity'))
+    return {product_info: f'Недостаточно товара: в наличии {stock.get(product_info, 0)}, в заказе {quantity}'
+            for product_info, quantity in shortage}
@@ -0,0 +1,56 @@
+import json
+from collections import defaultdict
+
+from app.models import ProductInfo, ProductParameter, CatalogEntry
+
+# Поля ProductInfo, из которых строится запись каталога, в порядке полей CatalogEntry
+ENTRY_FIELDS = {
+    'product_info_id': 'id',
+    'product_id': 'product_id',
+    'category_id': 'product__category_id',
+    'shop_id': 'shop_id',
+    'product_name': 'product__name',
+    'category_name': 'product__category__name',
+    'shop_name': 'shop__name',
+    'model': 'model',
+    'external_id': 'external_id',
+    'price': 'price',
+    'price_rrc': 'price_rrc',
+    'quantity': 'quantity',
+}
+
+
+def dump_parameters(parameters):
+    """
+    Параметры предложения в виде JSON, отсортированные по имени
+    """
+    return json.dumps(dict(sorted(parameters)), ensure_ascii=False)
+
+
+def refresh_catalog(product_ids, batch_size=500):
+    """
+    Пересборка записей каталога для всех предложений указанных товаров
+
+    Вызывается импортом для товаров, у которых изменились предложения
+    или значения параметров.
+    """
+    product_ids = sorted(product_ids)
+    entries = 0
+    for start in range(0, len(product_ids), batch_size):
+        batch = product_ids[start:start + batch_size]
+
+        parameters = defaultdict(list)
+        for product_info_id, name, value in ProductParameter.objects.filter(
+                product_info__product_id__in=batch,
+        ).values_list('product_info_id', 'parameter__name', 'value'):
+            parameters[product_info_id].append((name, value))
+
+        catalog = [
+            CatalogEntry(parameters=dump_parameters(parameters[row[0]]), **dict(zip(ENTRY_FIELDS, row)))
+            for row in ProductInfo.objects.filter(product_id__in=batch).values_list(*ENTRY_FIELDS.values())
+        ]
+
+        CatalogEntry.objects.filter(product_id__in=batch).delete()
+        CatalogEntry.objects.bulk_create(catalog, batch_size=batch_size)
+        entries += len(catalog)
+    return entries
@@ -0,0 +1,131 @@
+import math
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from app.models import Category, ParameterFacet, ProductParameter
+
+# Префикс параметров запроса для фильтра по значению параметра: param_<id>
+PARAMETER_PREFIX = 'param_'
+# Суффиксы для фильтра по диапазону числовых значений: param_<id>_min, param_<id>_max
+RANGE_SUFFIXES = {'_min': 'value_number__gte', '_max': 'value_number__lte'}
+
+
+def parse_number(value):
+    """
+    Числовое значение параметра или None, если значение не похоже на число
+    """
+    try:
+        number = float(str(value).strip().replace(',', '.'))
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+def parse_parameter_filters(query_params):
+    """
+    Фильтры по параметрам из строки запроса
+
+    param_<id>=значение - равенство (несколько значений через запятую),
+    param_<id>_min / param_<id>_max - диапазон для числовых значений.
+    Возвращает {id параметра: {lookup: значение}}.
+    """
+    filters = {}
+    for key, value in query_params.items():
+        if not key.startswith(PARAMETER_PREFIX) or value == '':
+            continue
+        name, lookup = key[len(PARAMETER_PREFIX):], 'value__in'
+        for suffix, range_lookup in RANGE_SUFFIXES.items():
+            if name.endswith(suffix):
+                name, lookup = name[:-len(suffix)], range_lookup
+                break
+        if not name.isdigit():
+            raise ValueError(f'Неверный параметр {key}')
+        if lookup == 'value__in':
+            value = value.split(',')
+        else:
+            value = parse_number(value)
+            if value is None:
+                raise ValueError(f'Параметр {key} должен быть числом')
+        filters.setdefault(int(name), {})[lookup] = value
+    return filters
+
+
+def filter_offers(offers, filters):
+    """
+    Предложения, у которых выполнены все фильтры по параметрам
+    """
+    for parameter_id, lookups in filters.items():
+        offers = offers.filter(id__in=ProductParameter.objects.filter(
+            parameter_id=parameter_id, **lookups).values('product_info_id'))
+    return offers
+
+
+def refresh_facets(shop_id):
+    """
+    Пересчет индекса фасетов после импорта прайса магазина
+
+    Пересчитываются строки магазина и общие строки (shop=None) по всем
+    категориям, связанным с магазином. Счетчик - количество разных товаров
+    с данным значением параметра.
+    """
+    category_ids = list(Category.objects.filter(shops=shop_id).values_list('id', flat=True))
+    with transaction.atomic():
+        ParameterFacet.objects.filter(shop_id=shop_id).delete()
+        ParameterFacet.objects.filter(shop__isnull=True, category_id__in=category_ids).delete()
+
+        facets = [
+            ParameterFacet(shop_id=shop_id, **row)
+            for row in count_values(ProductParameter.objects.filter(product_info__shop_id=shop_id))
+        ]
+        facets.extend(
+            ParameterFacet(**row)
+            for row in count_values(ProductParameter.objects.filter(
+                product_info__product__category_id__in=category_ids))
+        )
+        ParameterFacet.objects.bulk_create(facets, batch_size=500)
+    return len(facets)
+
+
+def count_values(product_parameters):
+    return product_parameters.values(
+        'parameter_id', 'value', category_id=F('product_info__product__category_id'),
+    ).annotate(count=Count('product_info__product_id', distinct=True)).order_by()
+
+
+def get_facets(category_id=None, shop_id=None, offers=None):
+    """
+    Счетчики товаров по значениям параметров для текущей выборки: (фасеты, с учетом фильтров)
+
+    offers - предложения, отобранные фильтрами по тексту, цене и параметрам.
+    Без них счетчики берутся из индекса ParameterFacet по категории и
+    магазину. С ними счетчики считаются по отобранным предложениям, только
+    если их не больше FACET_LIVE_LIMIT: сначала выбираются id не более
+    FACET_LIVE_LIMIT + 1 предложений, и подсчет ограничен этим списком.
+    Для более широкой выборки счетчики тоже берутся из индекса, то есть без
+    учета фильтров, и второй элемент результата - False.
+    """
+    filtered = True
+    if offers is not None:
+        offer_ids = list(offers.order_by().values_list('id', flat=True)[:settings.FACET_LIVE_LIMIT + 1])
+        if len(offer_ids) > settings.FACET_LIVE_LIMIT:
+            offers, filtered = None, False
+
+    if offers is None:
+        rows = ParameterFacet.objects.filter(shop_id=shop_id) if shop_id else \
+            ParameterFacet.objects.filter(shop__isnull=True)
+        if category_id:
+            rows = rows.filter(category_id=category_id)
+        rows = rows.values('parameter_id', 'value', name=F('parameter__name')).annotate(total=Sum('count'))
+    else:
+        rows = ProductParameter.objects.filter(product_info_id__in=offer_ids).values(
+            'parameter_id', 'value', name=F('parameter__name'),
+        ).annotate(total=Count('product_info__product_id', distinct=True))
+
+    facets = OrderedDict()
+    for row in rows.order_by('parameter__name', '-total', 'value'):
+        facet = facets.setdefault(row['parameter_id'], {'id': row['parameter_id'], 'name': row['name'], 'values': []})
+        facet['values'].append({'value': row['value'], 'count': row['total']})
+    return list(facets.values()), filtered
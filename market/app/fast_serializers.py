@@ -0,0 +1,185 @@
+from collections import defaultdict
+
+from rest_framework import serializers
+
+from app.models import Product, ProductInfo, Order, OrderItem, Contact
+
+
+class ValuesSerializer:
+    """
+    Сериализация только для чтения из строк values() без экземпляров моделей
+
+    Список полей разбирается один раз при создании сериализатора:
+     * fields - поля ответа в порядке вывода;
+     * sources - ключ values() для поля ответа, если он отличается;
+     * converters - преобразование значения поля;
+     * joined - вложенный объект по ForeignKey: поле ответа -> (сериализатор,
+       связь); его поля выбираются тем же запросом через JOIN;
+     * many - вложенный список по обратной связи: поле ответа -> (сериализатор,
+       поле связи дочерней модели); загружается одним запросом на страницу,
+       в порядке первичного ключа.
+
+    Поля optional_fields выводятся только по запросу. Без выбора полей
+    результат совпадает с выводом соответствующего ModelSerializer.
+    """
+    model = None
+    fields = ()
+    optional_fields = ()
+    sources = {}
+    converters = {}
+    joined = {}
+    many = {}
+
+    def __init__(self, prefix='', fields=None, expand=()):
+        self.selected = self.select_fields(fields, expand)
+        self.columns = [prefix + 'id']
+        self.plan = []
+        for name in self.selected:
+            if name in self.joined:
+                serializer_class, relation = self.joined[name]
+                nested = serializer_class(prefix=f'{prefix}{relation}__')
+                self.columns.extend(column for column in nested.columns if column not in self.columns)
+                self.plan.append((name, 'joined', nested))
+            elif name in self.many:
+                serializer_class, link = self.many[name]
+                self.plan.append((name, 'many', (serializer_class(), link)))
+            else:
+                column = prefix + self.sources.get(name, name)
+                if column not in self.columns:
+                    self.columns.append(column)
+                self.plan.append((name, 'value', (column, self.converters.get(name))))
+
+    @classmethod
+    def select_fields(cls, fields=None, expand=()):
+        """
+        Поля ответа в порядке объявления, при неизвестном поле - ValueError
+
+        fields - выводимые поля (None - поля по умолчанию), expand - вложенные
+        объекты, которые выводятся в дополнение к fields.
+        """
+        available = cls.fields + cls.optional_fields
+        nested = set(cls.joined) | set(cls.many)
+        unknown = [name for name in fields or () if name not in available]
+        unknown += [name for name in expand if name not in nested]
+        if unknown:
+            raise ValueError(f'Неизвестные поля: {", ".join(unknown)}')
+        selected = set(cls.fields if fields is None else fields) | set(expand)
+        return [name for name in available if name in selected]
+
+    @classmethod
+    def for_query(cls, query_params):
+        """
+        Сериализатор с полями из параметров запроса fields и expand (через запятую)
+        """
+        fields = [name.strip() for name in query_params.get('fields', '').split(',') if name.strip()]
+        expand = [name.strip() for name in query_params.get('expand', '').split(',') if name.strip()]
+        return cls(fields=fields or None, expand=expand)
+
+    def values(self, queryset, *extra):
+        """
+        Queryset строк со всеми нужными сериализатору ключами
+
+        extra - дополнительные ключи, например поля сортировки для пагинации.
+        """
+        extra = [column for column in extra if column not in self.columns]
+        return queryset.prefetch_related(None).values(*self.columns, *extra)
+
+    def to_representation(self, rows):
+        rows = list(rows)
+        related = {}
+        for name, kind, spec in self.plan:
+            if kind == 'many':
+                nested, link = spec
+                related[name] = nested.load(link, [row[self.columns[0]] for row in rows])
+        return [self.represent(row, related) for row in rows]
+
+    def represent(self, row, related=None):
+        item = {}
+        for name, kind, spec in self.plan:
+            if kind == 'value':
+                column, convert = spec
+                item[name] = row[column] if convert is None else convert(row[column])
+            elif kind == 'joined':
+                item[name] = None if row[spec.columns[0]] is None else spec.represent(row)
+            else:
+                item[name] = related[name].get(row[self.columns[0]], [])
+        return item
+
+    def load(self, link, keys):
+        """
+        Вложенные списки для родительских ключей: ключ -> список словарей
+        """
+        grouped = defaultdict(list)
+        if keys:
+            rows = self.model.objects.filter(**{f'{link}__in': keys}).order_by('pk').values(link, *self.columns)
+            for row in rows:
+                grouped[row[link]].append(self.represent(row))
+        return grouped
+
+
+class ProductInfoValuesSerializer(ValuesSerializer):
+    model = ProductInfo
+    fields = ('model', 'external_id', 'shop', 'quantity', 'price', 'price_rrc')
+
+
+class ProductValuesSerializer(ValuesSerializer):
+    """
+    Быстрый аналог ProductSerializer
+
+    Поле min_price выводится по запросу, queryset должен содержать эту аннотацию.
+    """
+    model = Product
+    fields = ('id', 'name', 'category', 'product_infos')
+    optional_fields = ('min_price',)
+    many = {'product_infos': (ProductInfoValuesSerializer, 'product')}
+
+
+class ProductPriceValuesSerializer(ProductValuesSerializer):
+    """
+    Товар с минимальной ценой подходящих предложений (аннотация min_price)
+    """
+    fields = ProductValuesSerializer.fields + ('min_price',)
+    optional_fields = ()
+
+
+class ContactValuesSerializer(ValuesSerializer):
+    model = Contact
+    fields = ('id', 'city', 'street', 'house', 'structure', 'building', 'apartment', 'phone', 'user')
+
+
+class OrderItemValuesSerializer(ValuesSerializer):
+    """
+    Быстрый аналог OrderItemSerializer
+    """
+    model = OrderItem
+    fields = ('id', 'product_info', 'quantity', 'order')
+
+
+class BasketItemValuesSerializer(ValuesSerializer):
+    """
+    Позиция корзины с названием товара, магазином и ценой
+
+    Поле sum - стоимость позиции, queryset должен содержать эту аннотацию.
+    """
+    model = OrderItem
+    fields = ('id', 'product_info', 'quantity', 'order', 'product', 'product_name', 'model',
+              'shop', 'shop_name', 'price', 'sum')
+    sources = {
+        'product': 'product_info__product',
+        'product_name': 'product_info__product__name',
+        'model': 'product_info__model',
+        'shop': 'product_info__shop',
+        'shop_name': 'product_info__shop__name',
+        'price': 'product_info__price',
+    }
+
+
+class OrderValuesSerializer(ValuesSerializer):
+    """
+    Быстрый аналог OrderSerializer
+    """
+    model = Order
+    fields = ('id', 'ordered_items', 'state', 'dt', 'contact')
+    converters = {'dt': serializers.DateTimeField().to_representation}
+    joined = {'contact': (ContactValuesSerializer, 'contact')}
+    many = {'ordered_items': (OrderItemValuesSerializer, 'order')}
@@ -0,0 +1,127 @@
+import hashlib
+import os
+from tempfile import SpooledTemporaryFile
+from time import perf_counter
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+from django.conf import settings
+
+# Размер порции при чтении ответа
+CHUNK_SIZE = 64 * 1024
+# Размер прайса, до которого он хранится в памяти, а не во временном файле
+SPOOL_SIZE = 8 * 1024 * 1024
+
+_session = None
+_session_pid = None
+
+
+def get_session():
+    """
+    Общая для процесса HTTP-сессия с пулом соединений
+
+    После fork сессия создается заново, чтобы не делить сокеты с родителем.
+    """
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        _session = Session()
+        _session.headers['Accept-Encoding'] = 'gzip, deflate'
+        adapter = HTTPAdapter(pool_connections=20, pool_maxsize=10)
+        _session.mount('http://', adapter)
+        _session.mount('https://', adapter)
+        _session_pid = os.getpid()
+    return _session
+
+
+def count_connections(session):
+    """
+    Количество соединений, открытых пулами сессии за время их жизни
+    """
+    total = 0
+    for adapter in set(session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        total += sum(pools[key].num_connections for key in pools.keys())
+    return total
+
+
+class FetchResult:
+    """
+    Результат загрузки прайса
+    """
+
+    def __init__(self, not_modified, body=None, content_type='', etag='', last_modified='', digest='',
+                 size=0, elapsed=0.0, reused=None):
+        self.not_modified = not_modified
+        self.body = body
+        self.content_type = content_type
+        self.etag = etag
+        self.last_modified = last_modified
+        self.digest = digest
+        self.size = size
+        self.elapsed = elapsed
+        self.reused = reused
+
+
+def fetch_price_list(url, etag='', last_modified=''):
+    """
+    Условная загрузка прайса по ссылке
+
+    При совпадении ETag или Last-Modified сервер отвечает 304 и тело не
+    загружается. Иначе тело сохраняется во временный файл с подсчетом
+    SHA-256, чтобы неизменившийся прайс можно было пропустить без разбора.
+
+    Загрузка ограничена тайм-аутами соединения и чтения, общим временем
+    PRICE_LIST_FETCH_DEADLINE и размером PRICE_LIST_MAX_SIZE (после распаковки
+    gzip/deflate). В результате возвращаются размер, время загрузки и признак
+    повторного использования соединения из пула.
+    """
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+
+    session = get_session()
+    connections_before = count_connections(session)
+    max_size = settings.PRICE_LIST_MAX_SIZE
+
+    start = perf_counter()
+    with session.get(url, headers=headers, stream=True,
+                     timeout=(settings.PRICE_LIST_CONNECT_TIMEOUT, settings.PRICE_LIST_READ_TIMEOUT)) as response:
+        reused = count_connections(session) == connections_before
+
+        if response.status_code == 304:
+            return FetchResult(not_modified=True, etag=etag, last_modified=last_modified,
+                               elapsed=perf_counter() - start, reused=reused)
+        response.raise_for_status()
+
+        if int(response.headers.get('Content-Length') or 0) > max_size:
+            raise ValueError(f'Размер прайса превышает {max_size} байт')
+
+        body = SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_size:
+                    raise ValueError(f'Размер прайса превышает {max_size} байт')
+                if perf_counter() - start > settings.PRICE_LIST_FETCH_DEADLINE:
+                    raise TimeoutError(f'Загрузка прайса дольше {settings.PRICE_LIST_FETCH_DEADLINE} с')
+                digest.update(chunk)
+                body.write(chunk)
+        except Exception:
+            body.close()
+            raise
+        body.seek(0)
+
+        return FetchResult(not_modified=False,
+                           body=body,
+                           content_type=response.headers.get('Content-Type', ''),
+                           etag=response.headers.get('ETag', ''),
+                           last_modified=response.headers.get('Last-Modified', ''),
+                           digest=digest.hexdigest(),
+                           size=size,
+                           elapsed=perf_counter() - start,
+                           reused=reused)
@@ -0,0 +1,98 @@
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from app.models import IdempotencyKey
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+KEY_MAX_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+
+
+def expiry_cutoff():
+    return timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+
+
+def claim_key(user_id, key):
+    """
+    Запись ключа для нового запроса или None, если ключ уже использован
+
+    Ключ, запрос по которому не завершился за IDEMPOTENCY_KEY_LEASE секунд
+    (например, обработчик упал), перехватывается условным UPDATE: запрос
+    выполняется заново, а ответ прежнего владельца уже не сохранится.
+    """
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(user_id=user_id, key=key)
+        except IntegrityError:
+            now = timezone.now()
+            stalled = IdempotencyKey.objects.filter(user_id=user_id, key=key, status__isnull=True,
+                                                    locked_at__lt=now - timedelta(seconds=settings.IDEMPOTENCY_KEY_LEASE))
+            if stalled.update(locked_at=now):
+                return IdempotencyKey.objects.get(user_id=user_id, key=key)
+            # Просроченный ключ освобождается, и запрос выполняется заново
+            if not IdempotencyKey.objects.filter(user_id=user_id, key=key, created_at__lt=expiry_cutoff()).delete()[0]:
+                return None
+    return None
+
+
+def replay(user_id, key):
+    """
+    Сохраненный ответ на запрос с тем же ключом
+    """
+    record = IdempotencyKey.objects.filter(user_id=user_id, key=key).first()
+    if record is None or record.status is None:
+        return JsonResponse({'Status': False, 'Error': 'Запрос с этим Idempotency-Key еще выполняется'}, status=409)
+    response = HttpResponse(record.body, status=record.status, content_type='application/json')
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(method):
+    """
+    Идемпотентность метода APIView по заголовку Idempotency-Key
+
+    Первый ответ на запрос с ключом сохраняется, повторы с тем же ключом
+    от того же пользователя получают его без повторного выполнения метода.
+    Пока первый запрос выполняется, повторы получают 409; если он не
+    завершился за IDEMPOTENCY_KEY_LEASE секунд, повтор выполняется заново
+    (от повторного размещения заказ защищает проверка статуса корзины в
+    app.basket.place_order). Запрос без
+    заголовка выполняется как обычно. Ключи хранятся IDEMPOTENCY_KEY_TTL
+    секунд, просроченные удаляет команда purge_idempotency_keys.
+    """
+    @wraps(method)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.META.get(HEADER)
+        if key is None:
+            return method(view, request, *args, **kwargs)
+        if not key or len(key) > KEY_MAX_LENGTH:
+            return JsonResponse({'Status': False, 'Error': f'Idempotency-Key - строка до {KEY_MAX_LENGTH} символов'},
+                                status=400)
+
+        record = claim_key(request.user.id, key)
+        if record is None:
+            return replay(request.user.id, key)
+
+        # Ключ меняется, только пока он не перехвачен другим запросом
+        owned = IdempotencyKey.objects.filter(pk=record.pk, locked_at=record.locked_at, status__isnull=True)
+        try:
+            response = method(view, request, *args, **kwargs)
+        except BaseException:
+            owned.delete()
+            raise
+        owned.update(status=response.status_code, body=response.content.decode())
+        return response
+
+    return wrapper
+
+
+def purge_expired_keys():
+    """
+    Удаление ключей старше IDEMPOTENCY_KEY_TTL, возвращает количество удаленных
+    """
+    return IdempotencyKey.objects.filter(created_at__lt=expiry_cutoff()).delete()[0]
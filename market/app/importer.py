@@ -0,0 +1,585 @@
+from collections import defaultdict, OrderedDict
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from app.autocomplete import bump_catalog_version
+from app.basket import invalidate_summaries
+from app.catalog import refresh_catalog
+from app.facets import parse_number, refresh_facets
+from app.models import Shop, Category, Product, ProductInfo, Parameter, ProductParameter, CatalogEntry
+from app.offers import refresh_best_offers
+from app.parsers import BATCH_SIZE
+from app.search import index_products
+
+
+class ImportStats:
+    """
+    Статистика импорта: время по фазам и количество строк
+    """
+
+    def __init__(self):
+        self.timings = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.caches = defaultdict(lambda: defaultdict(int))
+        self.batches = 0
+
+    @contextmanager
+    def phase(self, name):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += perf_counter() - start
+
+    def count(self, name, value=1):
+        self.counts[name] += value
+
+    def cache(self, name, local_hits, shared_hits, misses):
+        stats = self.caches[name]
+        stats['local_hits'] += local_hits
+        stats['shared_hits'] += shared_hits
+        stats['misses'] += misses
+
+    def as_dict(self):
+        caches = {}
+        for name, stats in self.caches.items():
+            total = stats['local_hits'] + stats['shared_hits'] + stats['misses']
+            caches[name] = dict(stats, hit_rate=round(1 - stats['misses'] / total, 4) if total else None)
+        return {
+            'batches': self.batches,
+            'timings': {name: round(value, 4) for name, value in self.timings.items()},
+            'counts': dict(self.counts),
+            'caches': caches,
+        }
+
+
+class LookupCache:
+    """
+    Соответствие ключ -> id с вытеснением давно не использованных записей
+
+    Без maxsize размер не ограничен (кэш в пределах одного импорта).
+    """
+
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+
+    def get_many(self, keys):
+        """
+        Возвращает найденные значения и множество отсутствующих ключей
+        """
+        found, missing = {}, set()
+        for key in keys:
+            if key in self.data:
+                found[key] = self.data[key]
+                if self.maxsize:
+                    self.data.move_to_end(key)
+            else:
+                missing.add(key)
+        return found, missing
+
+    def update(self, mapping):
+        self.data.update(mapping)
+        if self.maxsize:
+            for key in mapping:
+                self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        self.data.clear()
+
+
+# Кэши, общие для импортов в одном процессе (включаются IMPORT_LOOKUP_CACHE_SIZE)
+shared_caches = {}
+
+
+def get_shared_cache(name):
+    if not settings.IMPORT_LOOKUP_CACHE_SIZE:
+        return None
+    if name not in shared_caches:
+        shared_caches[name] = LookupCache(maxsize=settings.IMPORT_LOOKUP_CACHE_SIZE)
+    return shared_caches[name]
+
+
+def chunks(items, size):
+    """
+    Разбиение последовательности на пакеты фиксированного размера
+    """
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class ShopImportBusy(Exception):
+    """
+    Магазин уже импортируется другим процессом
+    """
+
+
+class PriceListImporter:
+    """
+    Пакетный импорт прайса магазина
+
+    Категории, товары и параметры определяются несколькими запросами на пакет,
+    запись ведется через bulk_create/bulk_update.
+
+    В режиме синхронизации (sync=True) предложения сопоставляются по паре
+    (магазин, внешний ИД): записываются только изменившиеся строки, а
+    отсутствующие в прайсе предложения удаляются в конце импорта.
+    В противном случае все предложения магазина удаляются и создаются заново.
+
+    При atomic=False каждый раздел и пакет товаров фиксируется отдельной
+    транзакцией, что позволяет наблюдать ход импорта из других соединений.
+    Чтобы импорты одного магазина не чередовались, магазин на все время
+    импорта занимается отметкой Shop.import_started_at (продлевается с
+    каждым пакетом, см. IMPORT_SHOP_LEASE); если магазин уже занят,
+    выбрасывается ShopImportBusy. При atomic=True очередность задает
+    блокировка строки магазина до конца общей транзакции.
+    После каждой записи вызывается progress(раздел, обработано_товаров).
+    Если задан write_lock, каждая такая транзакция выполняется под ним,
+    а разбор следующего пакета идет вне блокировки.
+
+    Без user_id импортируется только уже существующий магазин с таким
+    названием: магазины без владельца не создаются.
+
+    Для товаров с изменившимися предложениями или значениями параметров
+    пересчитываются лучшие предложения (app.offers.refresh_best_offers),
+    записи плоской проекции каталога (app.catalog.refresh_catalog) и
+    документы полнотекстового индекса (app.search.index_products). Это
+    делается в той же транзакции, что и запись раздела или пакета, поэтому
+    производные таблицы соответствуют уже зафиксированным предложениям и
+    после прерванного импорта. Индекс фасетов магазина
+    (app.facets.refresh_facets) пересчитывается целиком в конце импорта,
+    а изменение товаров или категорий увеличивает версию каталога, по
+    которой перестраивается индекс подсказок (app.autocomplete); при
+    atomic=False это делается и при ошибке импорта.
+
+    Уже определенные id категорий, товаров и параметров запоминаются на время
+    импорта, поэтому повторные имена не требуют запросов. При ненулевом
+    IMPORT_LOOKUP_CACHE_SIZE они также сохраняются между импортами процесса;
+    созданные записи попадают в общий кэш только после фиксации транзакции.
+    """
+
+    product_info_fields = ('product_id', 'model', 'price', 'price_rrc', 'quantity')
+
+    def __init__(self, user_id, batch_size=BATCH_SIZE, sync=True, atomic=True, progress=None, write_lock=None):
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self.sync = sync
+        self.atomic = atomic
+        self.progress = progress
+        self.write_lock = write_lock or nullcontext()
+        self.stats = ImportStats()
+        self.shop = None
+        self.leased = False
+        self.stale_product_infos = set()
+        self.pending = []
+        self.caches = {name: LookupCache() for name in ('categories', 'products', 'parameters')}
+        self.linked_categories = set()
+        self.facets_stale = False
+        self.catalog_changed = False
+        self.search_products = set()
+        self.offer_products = set()
+
+    def run(self, records):
+        """
+        Импорт прайса из последовательности записей (раздел, данные)
+
+        Записи формируют парсеры из app.parsers: ('shop', название),
+        ('categories', список категорий) и ('goods', пакет товаров).
+        """
+        with transaction.atomic() if self.atomic else nullcontext():
+            try:
+                for section, payload in records:
+                    with self.write_lock, transaction.atomic(savepoint=False):
+                        self.add_section(section, payload)
+                        self.refresh_products()
+                        self.renew_lease()
+                    self.report(section)
+                if self.shop is None:
+                    raise ValueError('Не указан магазин')
+                with self.write_lock, transaction.atomic(savepoint=False):
+                    self.finish()
+            except Exception:
+                if not self.atomic and self.shop is not None:
+                    # Зафиксированные пакеты остаются - фасеты и подсказки приводятся в соответствие с ними
+                    with self.write_lock, transaction.atomic(savepoint=False):
+                        self.refresh_shop()
+                raise
+            finally:
+                self.release_lease()
+            self.report('done')
+        return self.stats
+
+    def add_section(self, section, payload):
+        if section == 'shop':
+            self.set_shop(payload)
+            for pending_section, pending_payload in self.pending:
+                self.add_section(pending_section, pending_payload)
+            self.pending = []
+        elif self.shop is None:
+            # Разделы до shop откладываются до появления магазина
+            self.pending.append((section, payload))
+        elif section == 'categories':
+            self.add_categories(payload)
+        elif section == 'goods':
+            self.add_goods(payload)
+
+    def report(self, section):
+        if self.progress is not None:
+            self.progress(section, self.stats.counts['goods'])
+
+    def set_shop(self, name):
+        with self.stats.phase('shop'):
+            if self.user_id is None:
+                shop = Shop.objects.filter(name=name).order_by('id').first()
+                if shop is None:
+                    raise ValueError(f'Магазин {name} не найден: без пользователя магазины не создаются')
+            else:
+                shop, _ = Shop.objects.get_or_create(name=name, user_id=self.user_id)
+            # Блокировка строки магазина до конца транзакции (при atomic=True - всего импорта)
+            shop = Shop.objects.select_for_update().get(pk=shop.pk)
+            if not self.atomic:
+                self.claim_lease(shop)
+            self.shop = shop
+            product_infos = ProductInfo.objects.filter(shop_id=self.shop.id)
+            if self.sync:
+                self.stale_product_infos = set(product_infos.values_list('id', flat=True))
+            else:
+                self.offer_products.update(product_infos.values_list('product_id', flat=True))
+                self.search_products.update(self.offer_products)
+                product_infos.delete()
+                self.facets_stale = True
+
+    def claim_lease(self, shop):
+        """
+        Занятие магазина на время импорта без общей транзакции
+        """
+        now = timezone.now()
+        expired = now - timedelta(seconds=settings.IMPORT_SHOP_LEASE)
+        if not Shop.objects.filter(Q(import_started_at__isnull=True) | Q(import_started_at__lt=expired),
+                                   pk=shop.pk).update(import_started_at=now):
+            raise ShopImportBusy(f'Магазин {shop.name} уже импортируется')
+        self.leased = True
+
+    def renew_lease(self):
+        if self.leased:
+            Shop.objects.filter(pk=self.shop.pk).update(import_started_at=timezone.now())
+
+    def release_lease(self):
+        if self.leased:
+            with self.write_lock:
+                Shop.objects.filter(pk=self.shop.pk).update(import_started_at=None)
+            self.leased = False
+
+    def add_categories(self, categories):
+        with self.stats.phase('categories'):
+            names = {category['id']: category['name'] for category in categories}
+
+            def lookup(category_ids):
+                return dict(Category.objects.filter(id__in=category_ids).values_list('id', 'name'))
+
+            def create(category_ids):
+                Category.objects.bulk_create([Category(id=category_id, name=names[category_id])
+                                              for category_id in category_ids],
+                                             batch_size=self.batch_size, ignore_conflicts=True)
+                self.stats.count('categories_created', len(category_ids))
+                self.catalog_changed = True
+
+            existing = self.resolve('categories', set(names), lookup, create)
+
+            # Пустое название (например, без колонки category_name в CSV) не переименовывает категорию
+            changed = [Category(id=category_id, name=name) for category_id, name in names.items()
+                       if name and existing[category_id] != name]
+            Category.objects.bulk_update(changed, ['name'], batch_size=self.batch_size)
+            for category in changed:
+                CatalogEntry.objects.filter(category_id=category.id).update(category_name=category.name)
+            renamed = {category.id: category.name for category in changed}
+            self.caches['categories'].update(renamed)
+            shared = get_shared_cache('categories')
+            if renamed and shared is not None:
+                transaction.on_commit(lambda: shared.update(renamed))
+            self.stats.count('categories_updated', len(changed))
+            self.catalog_changed = self.catalog_changed or bool(changed)
+
+            # Связи с магазином создаются только недостающие, повторный импорт их не записывает
+            linked = set(names) - self.linked_categories
+            links = Category.shops.through.objects.filter(shop_id=self.shop.id)
+            missing = linked - set(links.filter(category_id__in=linked).values_list('category_id', flat=True))
+            links.bulk_create(
+                [Category.shops.through(category_id=category_id, shop_id=self.shop.id) for category_id in missing],
+                batch_size=self.batch_size, ignore_conflicts=True)
+            self.linked_categories.update(linked)
+
+    def add_goods(self, goods):
+        """
+        Запись одного пакета товаров
+        """
+        self.stats.batches += 1
+        self.stats.count('goods', len(goods))
+
+        with self.stats.phase('products'):
+            products = self.resolve_products({(item['name'], item['category']) for item in goods})
+
+        with self.stats.phase('parameters'):
+            parameters = self.resolve_parameters({name for item in goods for name in item['parameters']})
+
+        offers = {}
+        for item in goods:
+            offers[item['id']] = (
+                (products[(item['name'], item['category'])], item['model'], item['price'], item['price_rrc'],
+                 item['quantity']),
+                {parameters[name]: str(value) for name, value in item['parameters'].items()},
+            )
+
+        existing = self.match_product_infos(offers) if self.sync else {}
+
+        with self.stats.phase('product_infos'):
+            product_infos = self.write_product_infos(offers, existing)
+
+        with self.stats.phase('product_parameters'):
+            self.write_product_parameters(offers, product_infos, existing)
+
+    def match_product_infos(self, offers):
+        """
+        Поиск уже загруженных предложений магазина по внешнему ИД
+        """
+        with self.stats.phase('match'):
+            existing = {}
+            for row in ProductInfo.objects.filter(
+                    shop_id=self.shop.id, external_id__in=list(offers),
+            ).order_by('id').values_list('id', 'external_id', *self.product_info_fields):
+                product_info_id, external_id, values = row[0], row[1], row[2:]
+                if external_id not in existing:
+                    existing[external_id] = (product_info_id, values)
+            self.stale_product_infos.difference_update(product_info_id for product_info_id, _ in existing.values())
+            return existing
+
+    def write_product_infos(self, offers, existing):
+        """
+        Запись предложений пакета, возвращает соответствие внешний ИД -> id
+        """
+        product_infos = {external_id: product_info_id for external_id, (product_info_id, _) in existing.items()}
+
+        changed = [
+            ProductInfo(id=existing[external_id][0], **dict(zip(self.product_info_fields, values)))
+            for external_id, (values, _) in offers.items()
+            if external_id in existing and existing[external_id][1] != values
+        ]
+        ProductInfo.objects.bulk_update(changed, self.product_info_fields, batch_size=self.batch_size)
+
+        created = [
+            ProductInfo(external_id=external_id, shop_id=self.shop.id, **dict(zip(self.product_info_fields, values)))
+            for external_id, (values, _) in offers.items()
+            if external_id not in existing
+        ]
+        ProductInfo.objects.bulk_create(created, batch_size=self.batch_size)
+        if created:
+            for product_info_id, external_id in ProductInfo.objects.filter(
+                    shop_id=self.shop.id,
+                    external_id__in=[product_info.external_id for product_info in created],
+            ).order_by('id').values_list('id', 'external_id'):
+                if external_id not in existing:
+                    product_infos[external_id] = product_info_id
+
+        # Фасеты зависят от товара предложения, но не от цены и остатка
+        if created or any(values[0] != existing[external_id][1][0]
+                          for external_id, (values, _) in offers.items() if external_id in existing):
+            self.facets_stale = True
+        # Документ поиска зависит от товара и модели предложения
+        self.search_products.update(product_info.product_id for product_info in created)
+        self.offer_products.update(product_info.product_id for product_info in created)
+        for external_id, (values, _) in offers.items():
+            if external_id in existing and existing[external_id][1] != values:
+                self.offer_products.update((values[0], existing[external_id][1][0]))
+                if existing[external_id][1][:2] != values[:2]:
+                    self.search_products.update((values[0], existing[external_id][1][0]))
+
+        self.stats.count('product_infos_created', len(created))
+        self.stats.count('product_infos_updated', len(changed))
+        self.stats.count('product_infos_unchanged', len(existing) - len(changed))
+        return product_infos
+
+    def write_product_parameters(self, offers, product_infos, existing):
+        """
+        Запись значений параметров: новые создаются, изменившиеся обновляются на месте
+        """
+        current = defaultdict(dict)
+        if existing:
+            for row in ProductParameter.objects.filter(
+                    product_info_id__in=[product_info_id for product_info_id, _ in existing.values()],
+            ).values_list('id', 'product_info_id', 'parameter_id', 'value'):
+                current[row[1]][row[2]] = (row[0], row[3])
+
+        created, changed, deleted = [], [], []
+        for external_id, (offer_values, values) in offers.items():
+            product_info_id = product_infos[external_id]
+            old_values = current.get(product_info_id, {})
+            written = len(created) + len(changed) + len(deleted)
+            for parameter_id, value in values.items():
+                if parameter_id not in old_values:
+                    created.append(ProductParameter(product_info_id=product_info_id,
+                                                    parameter_id=parameter_id,
+                                                    value=value,
+                                                    value_number=parse_number(value)))
+                elif old_values[parameter_id][1] != value:
+                    changed.append(ProductParameter(id=old_values[parameter_id][0], value=value,
+                                                    value_number=parse_number(value)))
+            deleted.extend(product_parameter_id for parameter_id, (product_parameter_id, _) in old_values.items()
+                           if parameter_id not in values)
+            if len(created) + len(changed) + len(deleted) > written:
+                self.search_products.add(offer_values[0])
+
+        ProductParameter.objects.bulk_create(created, batch_size=self.batch_size)
+        ProductParameter.objects.bulk_update(changed, ['value', 'value_number'], batch_size=self.batch_size)
+        for batch in chunks(deleted, self.batch_size):
+            ProductParameter.objects.filter(id__in=batch).delete()
+        if created or changed or deleted:
+            self.facets_stale = True
+
+        self.stats.count('product_parameters_created', len(created))
+        self.stats.count('product_parameters_updated', len(changed))
+        self.stats.count('product_parameters_deleted', len(deleted))
+
+    def finish(self):
+        """
+        Удаление предложений, отсутствующих в прайсе, и пересчет производных данных
+        """
+        with self.stats.phase('cleanup'):
+            stale = sorted(self.stale_product_infos)
+            for batch in chunks(stale, self.batch_size):
+                product_infos = ProductInfo.objects.filter(id__in=batch)
+                product_ids = set(product_infos.values_list('product_id', flat=True))
+                self.search_products.update(product_ids)
+                self.offer_products.update(product_ids)
+                product_infos.delete()
+            self.stale_product_infos = set()
+            self.stats.count('product_infos_deleted', len(stale))
+            if stale:
+                self.facets_stale = True
+
+        self.refresh_products()
+        self.refresh_shop()
+
+    def refresh_products(self):
+        """
+        Пересчет проекции каталога, поискового индекса и лучших предложений
+        для товаров, предложения которых изменились с прошлого вызова
+        """
+        # Запись каталога зависит и от полей предложения, и от значений параметров
+        catalog_products = self.search_products | self.offer_products
+        if catalog_products:
+            with self.stats.phase('catalog'):
+                self.stats.count('catalog_entries', refresh_catalog(catalog_products, self.batch_size))
+
+        if self.search_products:
+            # Названия товаров и модели - данные подсказок app.autocomplete
+            self.catalog_changed = True
+            with self.stats.phase('search'):
+                self.stats.count('search_documents', index_products(self.search_products))
+            self.search_products = set()
+
+        if self.offer_products:
+            # Цены и состав предложений изменились - сводки корзин пересчитываются
+            invalidate_summaries()
+            with self.stats.phase('best_offers'):
+                self.stats.count('best_offers', refresh_best_offers(self.offer_products, self.batch_size))
+            self.offer_products = set()
+
+    def refresh_shop(self):
+        """
+        Пересчет фасетов магазина и версии каталога, если импорт их изменил
+        """
+        if self.facets_stale:
+            with self.stats.phase('facets'):
+                self.stats.count('facets', refresh_facets(self.shop.id))
+            self.facets_stale = False
+
+        if self.catalog_changed:
+            bump_catalog_version()
+            self.catalog_changed = False
+
+    def resolve(self, name, keys, lookup, create):
+        """
+        Получение значений по ключам: кэш импорта, общий кэш процесса, затем БД
+
+        lookup(ключи) возвращает найденные в БД значения, create(ключи)
+        создает отсутствующие записи.
+        """
+        local = self.caches[name]
+        shared = get_shared_cache(name)
+
+        found, missing = local.get_many(keys)
+        local_hits = len(found)
+        shared_hits = 0
+        if missing and shared is not None:
+            shared_found, missing = shared.get_many(missing)
+            shared_hits = len(shared_found)
+            local.update(shared_found)
+            found.update(shared_found)
+
+        self.stats.cache(name, local_hits, shared_hits, len(missing))
+        if not missing:
+            return found
+
+        existing = lookup(missing)
+        if shared is not None:
+            shared.update(existing)
+        missing -= existing.keys()
+        if missing:
+            create(missing)
+            created = lookup(missing)
+            existing.update(created)
+            if shared is not None:
+                transaction.on_commit(lambda: shared.update(created))
+        local.update(existing)
+        found.update(existing)
+        return found
+
+    def resolve_products(self, keys):
+        """
+        Получение id товаров по паре (название, категория) с созданием недостающих
+        """
+        def lookup(keys):
+            found = {}
+            for product_id, name, category_id in Product.objects.filter(
+                    name__in={name for name, _ in keys},
+                    category_id__in={category_id for _, category_id in keys},
+            ).order_by('-id').values_list('id', 'name', 'category_id'):
+                if (name, category_id) in keys:
+                    found[(name, category_id)] = product_id
+            return found
+
+        def create(keys):
+            Product.objects.bulk_create([Product(name=name, category_id=category_id) for name, category_id in keys],
+                                        batch_size=self.batch_size)
+            self.stats.count('products_created', len(keys))
+
+        return self.resolve('products', keys, lookup, create)
+
+    def resolve_parameters(self, names):
+        """
+        Получение id имен параметров с созданием недостающих
+        """
+        def lookup(names):
+            return dict(Parameter.objects.filter(name__in=names).order_by('-id').values_list('name', 'id'))
+
+        def create(names):
+            Parameter.objects.bulk_create([Parameter(name=name) for name in names], batch_size=self.batch_size)
+            self.stats.count('parameters_created', len(names))
+
+        return self.resolve('parameters', names, lookup, create)
+
+
+def import_price_list(records, user_id, **kwargs):
+    """
+    Импорт прайса из записей, полученных от парсера
+    """
+    return PriceListImporter(user_id, **kwargs).run(records)
@@ -0,0 +1,101 @@
+import json
+
+from django.utils import timezone
+
+from app.fetcher import fetch_price_list
+from app.importer import PriceListImporter, ShopImportBusy
+from app.models import ImportJob, Shop
+from app.parsers import detect_format, iter_price_list
+from app.validation import validate_price_list
+
+
+def claim_next_job():
+    """
+    Захват следующей задачи из очереди
+
+    Задача переводится в статус running условным UPDATE, поэтому
+    несколько обработчиков не получат одну и ту же задачу. Задачи
+    пользователя, у которого уже выполняется импорт, ждут его завершения.
+    """
+    while True:
+        running = ImportJob.objects.filter(state='running').values('user_id')
+        job = ImportJob.objects.filter(state='pending').exclude(user_id__in=running).order_by('id').first()
+        if job is None:
+            return None
+        claimed = ImportJob.objects.filter(pk=job.pk, state='pending').update(
+            state='running', phase='download', started_at=timezone.now())
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def run_import_job(job):
+    """
+    Загрузка прайса по ссылке из задачи, его проверка и импорт
+
+    Прайс сначала проверяется целиком и записывается, только если ошибок
+    нет; при dry_run выполняется только проверка. Если прайс не изменился
+    с прошлой загрузки (ответ 304 или совпадение SHA-256 содержимого),
+    разбор и запись пропускаются.
+    """
+    def progress(phase, rows_processed):
+        ImportJob.objects.filter(pk=job.pk).update(phase=phase, rows_processed=rows_processed)
+
+    def finish(state, **fields):
+        job.state = state
+        job.phase = 'done'
+        job.finished_at = timezone.now()
+        for name, value in fields.items():
+            setattr(job, name, value)
+        job.save(update_fields=['state', 'phase', 'finished_at', *fields])
+        return job
+
+    shop = Shop.objects.filter(user_id=job.user_id).first()
+    known = not job.dry_run and shop is not None and shop.url == job.url
+
+    try:
+        result = fetch_price_list(job.url,
+                                  etag=shop.etag if known else '',
+                                  last_modified=shop.last_modified if known else '')
+        ImportJob.objects.filter(pk=job.pk).update(bytes_fetched=result.size,
+                                                   fetch_time=result.elapsed,
+                                                   connection_reused=result.reused)
+        if result.not_modified or (known and result.digest == shop.content_digest):
+            Shop.objects.filter(pk=shop.pk).update(etag=result.etag, last_modified=result.last_modified)
+            return finish('skipped', shop=shop)
+
+        with result.body:
+            price_list_format = job.format or detect_format(result.content_type, job.url)
+
+            progress('validate', 0)
+            report = validate_price_list(iter_price_list(result.body, price_list_format))
+            if job.dry_run or not report.valid:
+                return finish('done' if report.valid else 'failed',
+                              rows_processed=report.goods,
+                              stats=json.dumps(report.as_dict(), ensure_ascii=False),
+                              error='' if report.valid else 'Прайс содержит ошибки')
+
+            progress('parse', 0)
+            result.body.seek(0)
+            importer = PriceListImporter(job.user_id, atomic=False, progress=progress)
+            importer_stats = importer.run(iter_price_list(result.body, price_list_format))
+    except ShopImportBusy:
+        # Магазин импортируется в другом месте - задача возвращается в очередь
+        ImportJob.objects.filter(pk=job.pk).update(state='pending', phase='', started_at=None)
+        job.refresh_from_db()
+        return job
+    except Exception as e:
+        job.state = 'failed'
+        job.error = str(e)
+        job.finished_at = timezone.now()
+        job.save(update_fields=['state', 'error', 'finished_at'])
+        return job
+
+    Shop.objects.filter(pk=importer.shop.pk).update(url=job.url,
+                                                    etag=result.etag,
+                                                    last_modified=result.last_modified,
+                                                    content_digest=result.digest)
+    return finish('done',
+                  shop=importer.shop,
+                  rows_processed=importer_stats.counts['goods'],
+                  stats=json.dumps(importer_stats.as_dict()))
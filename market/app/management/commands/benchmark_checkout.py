@@ -0,0 +1,118 @@
+import threading
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, DatabaseError
+
+from app.basket import place_order
+from app.models import Shop, Category, Product, ProductInfo, User, Contact, Order, OrderItem
+from app.parsers import BATCH_SIZE
+
+EMAIL_DOMAIN = 'checkout.benchmark'
+
+
+class Command(BaseCommand):
+    # Корректность резервирования проверяет app.tests.PlaceOrderContentionTest
+    help = 'Задержка параллельного размещения заказов с популярным товаром'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=200, help='Количество покупателей с корзинами')
+        parser.add_argument('--threads', type=int, default=16, help='Параллельных потоков оформления')
+        parser.add_argument('--stock', type=int, default=50, help='Остаток популярного товара')
+        parser.add_argument('--lines', type=int, default=3, help='Позиций в корзине, включая популярный товар')
+
+    def handle(self, *args, **options):
+        # Потоки работают через собственные соединения, поэтому данные фиксируются и удаляются в конце
+        hot, baskets = self.create_data(options)
+        try:
+            results = self.run_checkouts(baskets, options['threads'])
+            self.report(results, options)
+            self.check_stock(hot, options['stock'])
+        finally:
+            self.delete_data()
+
+    @staticmethod
+    def run_checkouts(baskets, threads):
+        results = []
+        lock = threading.Lock()
+
+        def worker(chunk):
+            try:
+                for basket_id, contact_id in chunk:
+                    start = perf_counter()
+                    try:
+                        outcome = 'placed' if not place_order(basket_id, contact_id) else 'shortage'
+                    except DatabaseError:
+                        outcome = 'failed'
+                    with lock:
+                        results.append((outcome, perf_counter() - start))
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker, args=(baskets[number::threads],)) for number in range(threads)]
+        start = perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return results, perf_counter() - start
+
+    def report(self, results, options):
+        results, elapsed = results
+        outcomes = {outcome: sum(1 for result, _ in results if result == outcome)
+                    for outcome in ('placed', 'shortage', 'failed')}
+        latencies = sorted(latency for _, latency in results)
+
+        def percentile(value):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * value))] * 1000
+
+        self.stdout.write(f"{options['buyers']} корзин, {options['threads']} потоков, остаток {options['stock']}: "
+                          f"размещено {outcomes['placed']}, не хватило товара {outcomes['shortage']}, "
+                          f"ошибок БД {outcomes['failed']} за {elapsed:.2f} с")
+        self.stdout.write(f'Задержка оформления: p50 {percentile(0.5):.1f} мс, p95 {percentile(0.95):.1f} мс, '
+                          f'p99 {percentile(0.99):.1f} мс, максимум {latencies[-1] * 1000:.1f} мс')
+        if outcomes['placed'] > options['stock']:
+            raise CommandError(f"Продано больше остатка: {outcomes['placed']} > {options['stock']}")
+
+    def check_stock(self, hot, stock):
+        """
+        Остаток популярного товара равен исходному минус количество в размещенных заказах
+        """
+        remaining = ProductInfo.objects.get(id=hot).quantity
+        ordered = sum(OrderItem.objects.filter(product_info_id=hot, order__state='new')
+                      .values_list('quantity', flat=True))
+        if remaining < 0 or remaining + ordered != stock:
+            raise CommandError(f'Остатки не сходятся: осталось {remaining}, в заказах {ordered}, было {stock}')
+        self.stdout.write(self.style.SUCCESS(f'Остатки сходятся: осталось {remaining}, в заказах {ordered}'))
+
+    @staticmethod
+    def create_data(options):
+        shop = Shop.objects.create(name='Магазин для замеров')
+        category = Category.objects.create(name='Категория для замеров')
+        Product.objects.bulk_create([Product(name=f'Товар {i}', category=category) for i in range(options['lines'])])
+        products = list(Product.objects.filter(category=category).order_by('id').values_list('id', flat=True))
+        ProductInfo.objects.bulk_create([
+            ProductInfo(product_id=product_id, shop=shop, external_id=i, model='', price=1000, price_rrc=1000,
+                        quantity=options['stock'] if i == 0 else options['buyers'])
+            for i, product_id in enumerate(products)
+        ])
+        product_infos = list(ProductInfo.objects.filter(shop=shop).order_by('id').values_list('id', flat=True))
+
+        User.objects.bulk_create([User(email=f'buyer{i}@{EMAIL_DOMAIN}', username=f'buyer{i}', password='!',
+                                       is_active=True) for i in range(options['buyers'])], batch_size=BATCH_SIZE)
+        users = list(User.objects.filter(email__endswith=EMAIL_DOMAIN).values_list('id', flat=True))
+        Contact.objects.bulk_create([Contact(user_id=user_id, city='Москва', street='Ленина', phone='+70000000000')
+                                     for user_id in users], batch_size=BATCH_SIZE)
+        Order.objects.bulk_create([Order(user_id=user_id, state='basket') for user_id in users],
+                                  batch_size=BATCH_SIZE)
+        baskets = list(Order.objects.filter(user_id__in=users).values_list('id', 'user__contacts__id'))
+        OrderItem.objects.bulk_create([OrderItem(order_id=basket_id, product_info_id=product_info, quantity=1)
+                                       for basket_id, _ in baskets for product_info in product_infos],
+                                      batch_size=BATCH_SIZE)
+        return product_infos[0], baskets
+
+    @staticmethod
+    def delete_data():
+        User.objects.filter(email__endswith=EMAIL_DOMAIN).delete()
+        Shop.objects.filter(name='Магазин для замеров').delete()
+        Category.objects.filter(name='Категория для замеров').delete()
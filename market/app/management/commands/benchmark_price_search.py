@@ -0,0 +1,94 @@
+import random
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from app.models import Shop, Category, Product, ProductInfo
+from app.offers import refresh_best_offers
+from app.parsers import BATCH_SIZE
+from app.views import FindProductsView
+
+SCENARIOS = (
+    ('Дешевые товары категории до 70 000', {'category_id': '{category}', 'max_price': '70000', 'ordering': 'price'}),
+    ('Диапазон цен магазина', {'shop_id': '{shop}', 'min_price': '20000', 'max_price': '30000'}),
+    ('Все магазины до 70 000 по цене', {'max_price': '70000', 'ordering': 'price'}),
+    ('Весь каталог по убыванию цены', {'ordering': '-price'}),
+)
+
+
+class Command(BaseCommand):
+    help = 'Планы и время запросов поиска товаров по цене на синтетическом каталоге'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000, help='Количество товаров')
+        parser.add_argument('--offers', type=int, default=3, help='Предложений на товар')
+        parser.add_argument('--shops', type=int, default=20, help='Количество магазинов')
+        parser.add_argument('--categories', type=int, default=50, help='Количество категорий')
+        parser.add_argument('--repeat', type=int, default=5, help='Повторов каждого запроса')
+        parser.add_argument('--keep', action='store_true', help='Не откатывать созданный каталог')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            start = perf_counter()
+            shops, categories = self.create_catalog(options)
+            self.stdout.write(f"Каталог: {options['products']} товаров, {options['products'] * options['offers']} "
+                              f"предложений за {perf_counter() - start:.1f} с")
+
+            for title, params in SCENARIOS:
+                params = {key: value.format(category=categories[0], shop=shops[0]) for key, value in params.items()}
+                queryset = self.get_queryset(params)[:51]
+
+                best = None
+                for _ in range(options['repeat']):
+                    start = perf_counter()
+                    rows = len(list(queryset.values_list('id', flat=True)))
+                    elapsed = perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+
+                self.stdout.write(self.style.SUCCESS(f'\n{title}: {params}'))
+                self.stdout.write(f'{rows} строк, лучшее время {best * 1000:.1f} мс')
+                self.stdout.write(queryset.values_list('id', flat=True).explain())
+
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+    @staticmethod
+    def get_queryset(params):
+        """
+        Queryset представления FindProductsView для параметров запроса
+        """
+        view = FindProductsView()
+        view.request = Request(APIRequestFactory().get('/', params))
+        view.format_kwarg = None
+        view.parse_filters(view.request)
+        return view.get_queryset()
+
+    @staticmethod
+    def create_catalog(options):
+        rnd = random.Random(1)
+        Shop.objects.bulk_create([Shop(name=f'Магазин {i}') for i in range(options['shops'])])
+        shops = list(Shop.objects.order_by('-id').values_list('id', flat=True)[:options['shops']])
+        Category.objects.bulk_create([Category(name=f'Категория {i}') for i in range(options['categories'])])
+        categories = list(Category.objects.order_by('-id').values_list('id', flat=True)[:options['categories']])
+
+        Product.objects.bulk_create(
+            [Product(name=f'Товар {i}', category_id=rnd.choice(categories)) for i in range(options['products'])],
+            batch_size=BATCH_SIZE,
+        )
+        products = Product.objects.order_by('-id').values_list('id', flat=True)[:options['products']]
+
+        offers = []
+        external_id = 0
+        for product_id in products:
+            for shop_id in rnd.sample(shops, min(options['offers'], len(shops))):
+                price = rnd.randrange(1000, 200000)
+                external_id += 1
+                offers.append(ProductInfo(product_id=product_id, shop_id=shop_id, external_id=external_id,
+                                          model='', quantity=rnd.randrange(0, 50),
+                                          price=price, price_rrc=price))
+        ProductInfo.objects.bulk_create(offers, batch_size=BATCH_SIZE)
+        refresh_best_offers(products, batch_size=BATCH_SIZE)
+        return shops, categories
@@ -0,0 +1,80 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from app.fast_serializers import ProductValuesSerializer, OrderValuesSerializer
+from app.models import Shop, Category, Product, ProductInfo, User, Contact, Order, OrderItem
+from app.parsers import BATCH_SIZE
+from app.serializers import ProductSerializer, OrderSerializer
+
+
+class Command(BaseCommand):
+    help = 'Сравнение ModelSerializer и быстрых сериализаторов на больших списках'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Количество товаров и заказов')
+        parser.add_argument('--repeat', type=int, default=3, help='Повторов каждого замера')
+
+    def handle(self, *args, **options):
+        renderer = JSONRenderer()
+        with transaction.atomic():
+            self.create_data(options['rows'])
+
+            cases = (
+                ('Товары', Product.objects.order_by('-id'), ProductSerializer, ProductValuesSerializer),
+                ('Заказы', Order.objects.order_by('-dt'), OrderSerializer, OrderValuesSerializer),
+            )
+            for title, queryset, serializer_class, values_serializer_class in cases:
+                slow, slow_time = self.measure(options['repeat'], lambda: renderer.render(
+                    serializer_class(serializer_class.setup_eager_loading(queryset), many=True).data))
+
+                def fast_render():
+                    serializer = values_serializer_class()
+                    return renderer.render(serializer.to_representation(serializer.values(queryset)))
+                fast, fast_time = self.measure(options['repeat'], fast_render)
+
+                if slow != fast:
+                    raise CommandError(f'{title}: ответы различаются')
+                self.stdout.write(f'{title}: {len(fast)} байт, ModelSerializer {slow_time * 1000:.0f} мс, '
+                                  f'values() {fast_time * 1000:.0f} мс ({slow_time / fast_time:.1f}x), '
+                                  f'ответы совпадают')
+
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def measure(repeat, render):
+        best = None
+        for _ in range(repeat):
+            start = perf_counter()
+            content = render()
+            elapsed = perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return content, best
+
+    @staticmethod
+    def create_data(rows):
+        shop = Shop.objects.create(name='Магазин для замеров')
+        category = Category.objects.create(name='Категория для замеров')
+        user = User.objects.create_user(email='benchmark@example.com', password=None, is_active=True)
+        contact = Contact.objects.create(user=user, city='Москва', street='Ленина', phone='+70000000000')
+
+        Product.objects.bulk_create([Product(name=f'Товар {i}', category=category) for i in range(rows)],
+                                    batch_size=BATCH_SIZE)
+        products = list(Product.objects.filter(category=category).values_list('id', flat=True))
+        ProductInfo.objects.bulk_create([
+            ProductInfo(product_id=product_id, shop=shop, external_id=i * 2 + offer, model=f'model-{i}',
+                        quantity=10, price=1000 + i, price_rrc=1100 + i)
+            for i, product_id in enumerate(products) for offer in range(2)
+        ], batch_size=BATCH_SIZE)
+        product_infos = list(ProductInfo.objects.filter(shop=shop).values_list('id', flat=True))
+
+        Order.objects.bulk_create([Order(user=user, state='new', contact=contact if i % 2 else None)
+                                   for i in range(rows)], batch_size=BATCH_SIZE)
+        orders = list(Order.objects.filter(user=user).values_list('id', flat=True))
+        OrderItem.objects.bulk_create([
+            OrderItem(order_id=order_id, product_info_id=product_infos[(i * 2 + item) % len(product_infos)],
+                      quantity=1)
+            for i, order_id in enumerate(orders) for item in range(2)
+        ], batch_size=BATCH_SIZE)
@@ -0,0 +1,109 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
+from time import perf_counter
+
+import django
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from app.parsers import BATCH_SIZE
+
+# Блокировка записи, общая для процессов пула
+write_lock = nullcontext()
+
+
+def init_worker(lock):
+    """
+    Подготовка процесса пула: соединения родителя не используются повторно
+
+    SQLite допускает только одного пишущего, поэтому для нее транзакции
+    записи процессов упорядочиваются общей блокировкой. Для остальных СУБД
+    магазины пишутся параллельно, конкурируя только за строку своего магазина.
+    """
+    global write_lock
+    if not apps.ready:
+        django.setup()
+    connections.close_all()
+    if connections['default'].vendor == 'sqlite':
+        write_lock = lock
+
+
+def import_source(source, batch_size):
+    """
+    Импорт одного прайса в процессе пула
+
+    Как и в задачах импорта (app.jobs), прайс сначала проверяется целиком
+    и записывается пакетами, только если ошибок нет.
+    """
+    from app.fetcher import fetch_price_list
+    from app.importer import PriceListImporter
+    from app.parsers import detect_format, iter_price_list
+    from app.validation import validate_price_list
+
+    start = perf_counter()
+    importer = PriceListImporter(None, batch_size=batch_size, atomic=False, write_lock=write_lock)
+    try:
+        if source.startswith(('http://', 'https://')):
+            result = fetch_price_list(source)
+            body, price_list_format = result.body, detect_format(result.content_type, source)
+        else:
+            body, price_list_format = open(source, 'rb'), detect_format(name=source)
+        with body:
+            report = validate_price_list(iter_price_list(body, price_list_format, batch_size=batch_size))
+            if not report.valid:
+                errors = '; '.join(f"{error['message']}: {error['count']} (строки {error['rows']})"
+                                   for error in report.errors.values())
+                return {'source': source, 'error': f'Прайс содержит ошибки: {errors}',
+                        'seconds': perf_counter() - start}
+            body.seek(0)
+            importer.run(iter_price_list(body, price_list_format, batch_size=batch_size))
+    except Exception as e:
+        return {'source': source, 'error': str(e), 'seconds': perf_counter() - start}
+    finally:
+        connections.close_all()
+
+    return {
+        'source': source,
+        'shop': importer.shop.name,
+        'rows': importer.stats.counts['goods'],
+        'seconds': perf_counter() - start,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Параллельный импорт прайсов уже зарегистрированных магазинов (поиск по названию)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('sources', nargs='+', help='Ссылки или пути к файлам прайсов')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Количество процессов')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Количество товаров в пакете')
+
+    def handle(self, *args, **options):
+        sources = options['sources']
+        workers = max(1, min(options['workers'] or 1, len(sources)))
+
+        connections.close_all()
+        start = perf_counter()
+        rows = 0
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(multiprocessing.Lock(),)) as executor:
+            futures = [executor.submit(import_source, source, options['batch_size']) for source in sources]
+            for future in as_completed(futures):
+                result = future.result()
+                if 'error' in result:
+                    self.stdout.write(self.style.ERROR(
+                        f"{result['source']}: {result['error']} ({result['seconds']:.2f} с)"))
+                else:
+                    rows += result['rows']
+                    self.stdout.write(
+                        f"{result['source']}: {result['shop']}, {result['rows']} товаров за {result['seconds']:.2f} с")
+        elapsed = perf_counter() - start
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано {rows} товаров из {len(sources)} прайсов за {elapsed:.2f} с '
+            f'({rows / elapsed:.0f} товаров/с, процессов: {workers})'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from app.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = 'Удаление просроченных ключей идемпотентности (старше IDEMPOTENCY_KEY_TTL)'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Удалено ключей: {purge_expired_keys()}')
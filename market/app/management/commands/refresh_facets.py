@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from app.facets import refresh_facets
+from app.models import Shop
+
+
+class Command(BaseCommand):
+    help = 'Пересчет индекса фасетов параметров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('shops', nargs='*', type=int, help='ИД магазинов (по умолчанию все)')
+
+    def handle(self, *args, **options):
+        shops = Shop.objects.order_by('id')
+        if options['shops']:
+            shops = shops.filter(id__in=options['shops'])
+        for shop in shops:
+            self.stdout.write(f'{shop.name}: {refresh_facets(shop.id)} строк')
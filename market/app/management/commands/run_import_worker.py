@@ -0,0 +1,36 @@
+from time import sleep
+
+from django.core.management.base import BaseCommand
+
+from app.jobs import claim_next_job, run_import_job
+
+
+class Command(BaseCommand):
+    help = 'Обработка очереди задач импорта прайсов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Обработать задачи в очереди и завершить работу')
+        parser.add_argument('--sleep', type=float, default=2.0,
+                            help='Пауза между опросами пустой очереди, сек')
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    return
+                sleep(options['sleep'])
+                continue
+
+            self.stdout.write(f'Задача {job.id}: {job.url}')
+            job = run_import_job(job)
+            if job.state == 'done':
+                self.stdout.write(self.style.SUCCESS(f'Задача {job.id}: обработано {job.rows_processed} товаров'))
+            elif job.state == 'skipped':
+                self.stdout.write(f'Задача {job.id}: прайс не изменился')
+            elif job.state == 'pending':
+                self.stdout.write(f'Задача {job.id}: магазин уже импортируется, задача возвращена в очередь')
+                sleep(options['sleep'])
+            else:
+                self.stdout.write(self.style.ERROR(f'Задача {job.id}: {job.error}'))
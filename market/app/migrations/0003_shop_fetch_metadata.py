@@ -0,0 +1,33 @@
+# Generated by Django 2.2.28 on 2026-10-18 14:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_importjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shop',
+            name='content_digest',
+            field=models.CharField(blank=True, max_length=64, verbose_name='SHA-256 прайса'),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='etag',
+            field=models.CharField(blank=True, max_length=200, verbose_name='ETag прайса'),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='last_modified',
+            field=models.CharField(blank=True, max_length=50, verbose_name='Last-Modified прайса'),
+        ),
+        migrations.AlterField(
+            model_name='importjob',
+            name='state',
+            field=models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Завершен'), ('skipped', 'Прайс не изменился'), ('failed', 'Ошибка')], default='pending', max_length=10, verbose_name='Статус'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.28 on 2026-10-18 14:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_shop_fetch_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='bytes_fetched',
+            field=models.PositiveIntegerField(default=0, verbose_name='Загружено байт'),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='connection_reused',
+            field=models.BooleanField(blank=True, null=True, verbose_name='Соединение из пула'),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='fetch_time',
+            field=models.FloatField(blank=True, null=True, verbose_name='Время загрузки, сек'),
+        ),
+    ]
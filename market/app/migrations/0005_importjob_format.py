@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 14:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_importjob_fetch_metrics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='format',
+            field=models.CharField(blank=True, choices=[('yaml', 'YAML'), ('json', 'JSON'), ('ndjson', 'NDJSON'), ('csv', 'CSV')], max_length=10, verbose_name='Формат прайса'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 2.2.28 on 2026-10-18 14:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_importjob_dry_run'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-dt'], name='order_user_dt'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['state', '-dt'], name='order_state_dt'),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 2.2.28 on 2026-10-18 14:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+import math
+
+
+def fill_value_number(apps, schema_editor):
+    ProductParameter = apps.get_model('app', 'ProductParameter')
+    changed = []
+    for product_parameter in ProductParameter.objects.only('id', 'value').iterator():
+        try:
+            number = float(product_parameter.value.strip().replace(',', '.'))
+        except ValueError:
+            continue
+        if math.isfinite(number):
+            product_parameter.value_number = number
+            changed.append(product_parameter)
+    ProductParameter.objects.bulk_update(changed, ['value_number'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_order_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParameterFacet',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.CharField(max_length=100, verbose_name='Значение')),
+                ('count', models.PositiveIntegerField(verbose_name='Количество товаров')),
+            ],
+            options={
+                'verbose_name': 'Фасет параметра',
+                'verbose_name_plural': 'Индекс фасетов параметров',
+            },
+        ),
+        migrations.AddField(
+            model_name='productparameter',
+            name='value_number',
+            field=models.FloatField(blank=True, null=True, verbose_name='Числовое значение'),
+        ),
+        migrations.RunPython(fill_value_number, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='productparameter',
+            index=models.Index(fields=['parameter', 'value'], name='product_parameter_value'),
+        ),
+        migrations.AddIndex(
+            model_name='productparameter',
+            index=models.Index(fields=['parameter', 'value_number'], name='product_parameter_number'),
+        ),
+        migrations.AddField(
+            model_name='parameterfacet',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='parameter_facets', to='app.Category', verbose_name='Категория'),
+        ),
+        migrations.AddField(
+            model_name='parameterfacet',
+            name='parameter',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facets', to='app.Parameter', verbose_name='Параметр'),
+        ),
+        migrations.AddField(
+            model_name='parameterfacet',
+            name='shop',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='parameter_facets', to='app.Shop', verbose_name='Магазин'),
+        ),
+        migrations.AddIndex(
+            model_name='parameterfacet',
+            index=models.Index(fields=['category', 'shop'], name='parameter_facet_category'),
+        ),
+        migrations.AddIndex(
+            model_name='parameterfacet',
+            index=models.Index(fields=['shop', 'category'], name='parameter_facet_shop'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 2.2.28 on 2026-10-18 15:12
+
+import app.search
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_parameter_facets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearch',
+            fields=[
+                ('product', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search', serialize=False, to='app.Product', verbose_name='Продукт')),
+                ('name', models.TextField(verbose_name='Название')),
+                ('model_names', models.TextField(db_column='models', verbose_name='Модели')),
+                ('parameters', models.TextField(verbose_name='Значения параметров')),
+                ('document', app.search.SearchDocumentField(db_column='app_product_search')),
+                ('rank', models.FloatField(verbose_name='Ранг')),
+                ('position', models.IntegerField(db_column='_rowid_', verbose_name='Позиция')),
+            ],
+            options={
+                'verbose_name': 'Поисковый индекс товара',
+                'verbose_name_plural': 'Поисковый индекс товаров',
+                'db_table': 'app_product_search',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(app.search.create_index, app.search.drop_index),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 2.2.28 on 2026-10-18 15:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_best_offers(apps, schema_editor):
+    ProductInfo = apps.get_model('app', 'ProductInfo')
+    BestOffer = apps.get_model('app', 'BestOffer')
+    best_offers = {}
+    for product_info_id, product_id, category_id, shop_id, price in ProductInfo.objects.filter(
+            quantity__gt=0,
+    ).order_by('product_id', 'price', 'id').values_list(
+            'id', 'product_id', 'product__category_id', 'shop_id', 'price').iterator():
+        if product_id in best_offers:
+            best_offers[product_id].offer_count += 1
+        else:
+            best_offers[product_id] = BestOffer(product_id=product_id, category_id=category_id,
+                                                product_info_id=product_info_id, shop_id=shop_id,
+                                                price=price, offer_count=1)
+    BestOffer.objects.bulk_create(best_offers.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_product_info_price_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BestOffer',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='best_offer', serialize=False, to='app.Product', verbose_name='Продукт')),
+                ('price', models.PositiveIntegerField(verbose_name='Минимальная цена')),
+                ('offer_count', models.PositiveIntegerField(verbose_name='Предложений в наличии')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='best_offers', to='app.Category', verbose_name='Категория')),
+                ('product_info', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.ProductInfo', verbose_name='Предложение')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='best_offers', to='app.Shop', verbose_name='Магазин')),
+            ],
+            options={
+                'verbose_name': 'Лучшее предложение',
+                'verbose_name_plural': 'Список лучших предложений',
+                'ordering': ('price', 'product_id'),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='bestoffer',
+            index=models.Index(fields=['price', 'product'], name='best_offer_price'),
+        ),
+        migrations.AddIndex(
+            model_name='bestoffer',
+            index=models.Index(fields=['category', 'price', 'product'], name='best_offer_category_price'),
+        ),
+        migrations.RunPython(fill_best_offers, migrations.RunPython.noop),
+    ]
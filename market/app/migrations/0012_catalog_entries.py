@@ -0,0 +1,70 @@
+# Generated by Django 2.2.28 on 2026-10-18 15:21
+
+from collections import defaultdict
+import json
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_catalog(apps, schema_editor):
+    ProductInfo = apps.get_model('app', 'ProductInfo')
+    ProductParameter = apps.get_model('app', 'ProductParameter')
+    CatalogEntry = apps.get_model('app', 'CatalogEntry')
+    fields = ('product_info_id', 'product_id', 'category_id', 'shop_id', 'product_name', 'category_name',
+              'shop_name', 'model', 'external_id', 'price', 'price_rrc', 'quantity')
+    product_info_ids = list(ProductInfo.objects.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(product_info_ids), 500):
+        batch = product_info_ids[start:start + 500]
+        parameters = defaultdict(list)
+        for product_info_id, name, value in ProductParameter.objects.filter(
+                product_info_id__in=batch).values_list('product_info_id', 'parameter__name', 'value'):
+            parameters[product_info_id].append((name, value))
+        CatalogEntry.objects.bulk_create([
+            CatalogEntry(parameters=json.dumps(dict(sorted(parameters[row[0]])), ensure_ascii=False),
+                         **dict(zip(fields, row)))
+            for row in ProductInfo.objects.filter(id__in=batch).values_list(
+                'id', 'product_id', 'product__category_id', 'shop_id', 'product__name', 'product__category__name',
+                'shop__name', 'model', 'external_id', 'price', 'price_rrc', 'quantity')
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_best_offers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogEntry',
+            fields=[
+                ('product_info', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='catalog_entry', serialize=False, to='app.ProductInfo', verbose_name='Предложение')),
+                ('product_name', models.CharField(max_length=80, verbose_name='Название')),
+                ('category_name', models.CharField(max_length=40, verbose_name='Категория')),
+                ('shop_name', models.CharField(max_length=50, verbose_name='Магазин')),
+                ('model', models.CharField(blank=True, max_length=80, verbose_name='Модель')),
+                ('external_id', models.PositiveIntegerField(verbose_name='Внешний ИД')),
+                ('price', models.PositiveIntegerField(verbose_name='Цена')),
+                ('price_rrc', models.PositiveIntegerField(verbose_name='Рекомендуемая розничная цена')),
+                ('quantity', models.PositiveIntegerField(verbose_name='Количество')),
+                ('parameters', models.TextField(default='{}', verbose_name='Параметры (JSON)')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='catalog_entries', to='app.Category', verbose_name='Категория')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='catalog_entries', to='app.Product', verbose_name='Продукт')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='catalog_entries', to='app.Shop', verbose_name='Магазин')),
+            ],
+            options={
+                'verbose_name': 'Запись каталога',
+                'verbose_name_plural': 'Проекция каталога',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='catalogentry',
+            index=models.Index(fields=['category', 'product_info'], name='catalog_entry_category'),
+        ),
+        migrations.AddIndex(
+            model_name='catalogentry',
+            index=models.Index(fields=['shop', 'product_info'], name='catalog_entry_shop'),
+        ),
+        migrations.RunPython(fill_catalog, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 2.2.28 on 2026-10-18 15:29
+
+from django.db import migrations, models
+
+
+def create_version(apps, schema_editor):
+    """
+    Единственная строка версии каталога, которую увеличивает импорт
+    """
+    CatalogVersion = apps.get_model('app', 'CatalogVersion')
+    CatalogVersion.objects.using(schema_editor.connection.alias).get_or_create(pk=1, defaults={'version': 0})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_catalog_entries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(default=0, verbose_name='Версия')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Изменен')),
+            ],
+            options={
+                'verbose_name': 'Версия каталога',
+                'verbose_name_plural': 'Версия каталога',
+            },
+        ),
+        migrations.RunPython(create_version, migrations.RunPython.noop),
+    ]
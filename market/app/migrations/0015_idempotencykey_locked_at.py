@@ -0,0 +1,19 @@
+# Generated by Django 2.2.28 on 2026-10-18 16:03
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0014_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='locked_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Захвачен'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 16:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0015_idempotencykey_locked_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shop',
+            name='import_started_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Импорт выполняется с'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 2.2.28 on 2026-10-18 16:10
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def merge_baskets(apps, schema_editor):
+    """
+    Лишние корзины пользователя сливаются в самую раннюю: количества одинаковых позиций складываются
+    """
+    Order = apps.get_model('app', 'Order')
+    OrderItem = apps.get_model('app', 'OrderItem')
+    db = schema_editor.connection.alias
+    users = Order.objects.using(db).filter(state='basket').order_by().values('user_id').annotate(
+        baskets=Count('id')).filter(baskets__gt=1).values_list('user_id', flat=True)
+    for user_id in list(users):
+        basket, *extra = Order.objects.using(db).filter(user_id=user_id, state='basket').order_by('id')
+        lines = {item.product_info_id: item for item in OrderItem.objects.using(db).filter(order=basket)}
+        for item in OrderItem.objects.using(db).filter(order__in=extra).order_by('id'):
+            if item.product_info_id in lines:
+                lines[item.product_info_id].quantity += item.quantity
+                lines[item.product_info_id].save(update_fields=['quantity'])
+                item.delete()
+            else:
+                item.order = basket
+                item.save(update_fields=['order'])
+                lines[item.product_info_id] = item
+        Order.objects.using(db).filter(id__in=[order.id for order in extra]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0016_shop_import_started_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_baskets, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(condition=models.Q(state='basket'), fields=('user',), name='unique_user_basket'),
+        ),
+    ]
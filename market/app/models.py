@@ -2,9 +2,12 @@ from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django_rest_passwordreset.tokens import get_token_generator
 
+from app.search import SEARCH_TABLE, SearchDocumentField
+
 STATE_CHOICES = (
     ('basket', 'Статус корзины'),
     ('new', 'Новый'),
@@ -21,6 +24,21 @@ USER_TYPE_CHOICES = (
 
 )
 
+PRICE_LIST_FORMAT_CHOICES = (
+    ('yaml', 'YAML'),
+    ('json', 'JSON'),
+    ('ndjson', 'NDJSON'),
+    ('csv', 'CSV'),
+)
+
+IMPORT_STATE_CHOICES = (
+    ('pending', 'В очереди'),
+    ('running', 'Выполняется'),
+    ('done', 'Завершен'),
+    ('skipped', 'Прайс не изменился'),
+    ('failed', 'Ошибка'),
+)
+
 
 class UserManager(BaseUserManager):
     """
@@ -103,8 +121,10 @@ class Shop(models.Model):
                                 blank=True, null=True,
                                 on_delete=models.CASCADE)
     state = models.BooleanField(verbose_name='статус получения заказов', default=True)
-
-    # filename
+    etag = models.CharField(verbose_name='ETag прайса', max_length=200, blank=True)
+    last_modified = models.CharField(verbose_name='Last-Modified прайса', max_length=50, blank=True)
+    content_digest = models.CharField(verbose_name='SHA-256 прайса', max_length=64, blank=True)
+    import_started_at = models.DateTimeField(verbose_name='Импорт выполняется с', blank=True, null=True)
 
     class Meta:
         verbose_name = 'Магазин'
@@ -159,6 +179,11 @@ class ProductInfo(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['product', 'shop', 'external_id'], name='unique_product_info'),
         ]
+        indexes = [
+            models.Index(fields=['shop', 'price'], name='product_info_shop_price'),
+            models.Index(fields=['product', 'price'], name='product_info_product_price'),
+            models.Index(fields=['price'], name='product_info_price'),
+        ]
 
 
 class Parameter(models.Model):
@@ -180,6 +205,7 @@ class ProductParameter(models.Model):
     parameter = models.ForeignKey(Parameter, verbose_name='Параметр', related_name='product_parameters', blank=True,
                                   on_delete=models.CASCADE)
     value = models.CharField(verbose_name='Значение', max_length=100)
+    value_number = models.FloatField(verbose_name='Числовое значение', blank=True, null=True)
 
     class Meta:
         verbose_name = 'Параметр'
@@ -187,6 +213,135 @@ class ProductParameter(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['product_info', 'parameter'], name='unique_product_parameter'),
         ]
+        indexes = [
+            models.Index(fields=['parameter', 'value'], name='product_parameter_value'),
+            models.Index(fields=['parameter', 'value_number'], name='product_parameter_number'),
+        ]
+
+
+class ParameterFacet(models.Model):
+    category = models.ForeignKey(Category, verbose_name='Категория', related_name='parameter_facets',
+                                 on_delete=models.CASCADE)
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='parameter_facets',
+                             blank=True, null=True,
+                             on_delete=models.CASCADE)
+    parameter = models.ForeignKey(Parameter, verbose_name='Параметр', related_name='facets',
+                                  on_delete=models.CASCADE)
+    value = models.CharField(verbose_name='Значение', max_length=100)
+    count = models.PositiveIntegerField(verbose_name='Количество товаров')
+
+    class Meta:
+        verbose_name = 'Фасет параметра'
+        verbose_name_plural = "Индекс фасетов параметров"
+        indexes = [
+            models.Index(fields=['category', 'shop'], name='parameter_facet_category'),
+            models.Index(fields=['shop', 'category'], name='parameter_facet_shop'),
+        ]
+
+    def __str__(self):
+        return f'{self.parameter}: {self.value} ({self.count})'
+
+
+class BestOffer(models.Model):
+    """
+    Самое дешевое предложение в наличии для каждого товара (см. app.offers)
+    """
+    product = models.OneToOneField(Product, verbose_name='Продукт', related_name='best_offer',
+                                   primary_key=True,
+                                   on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, verbose_name='Категория', related_name='best_offers',
+                                 on_delete=models.CASCADE)
+    product_info = models.ForeignKey(ProductInfo, verbose_name='Предложение', related_name='+',
+                                     on_delete=models.CASCADE)
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='best_offers',
+                             on_delete=models.CASCADE)
+    price = models.PositiveIntegerField(verbose_name='Минимальная цена')
+    offer_count = models.PositiveIntegerField(verbose_name='Предложений в наличии')
+
+    class Meta:
+        verbose_name = 'Лучшее предложение'
+        verbose_name_plural = "Список лучших предложений"
+        ordering = ('price', 'product_id')
+        indexes = [
+            models.Index(fields=['price', 'product'], name='best_offer_price'),
+            models.Index(fields=['category', 'price', 'product'], name='best_offer_category_price'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id}: {self.price}'
+
+
+class CatalogEntry(models.Model):
+    """
+    Плоская проекция каталога для чтения: строка на предложение (см. app.catalog)
+    """
+    product_info = models.OneToOneField(ProductInfo, verbose_name='Предложение', related_name='catalog_entry',
+                                        primary_key=True,
+                                        on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, verbose_name='Продукт', related_name='catalog_entries',
+                                on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, verbose_name='Категория', related_name='catalog_entries',
+                                 on_delete=models.CASCADE)
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='catalog_entries',
+                             on_delete=models.CASCADE)
+    product_name = models.CharField(max_length=80, verbose_name='Название')
+    category_name = models.CharField(max_length=40, verbose_name='Категория')
+    shop_name = models.CharField(max_length=50, verbose_name='Магазин')
+    model = models.CharField(max_length=80, verbose_name='Модель', blank=True)
+    external_id = models.PositiveIntegerField(verbose_name='Внешний ИД')
+    price = models.PositiveIntegerField(verbose_name='Цена')
+    price_rrc = models.PositiveIntegerField(verbose_name='Рекомендуемая розничная цена')
+    quantity = models.PositiveIntegerField(verbose_name='Количество')
+    parameters = models.TextField(verbose_name='Параметры (JSON)', default='{}')
+
+    class Meta:
+        verbose_name = 'Запись каталога'
+        verbose_name_plural = "Проекция каталога"
+        indexes = [
+            models.Index(fields=['category', 'product_info'], name='catalog_entry_category'),
+            models.Index(fields=['shop', 'product_info'], name='catalog_entry_shop'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_name} ({self.shop_name})'
+
+
+class ProductSearch(models.Model):
+    """
+    Полнотекстовый индекс товаров (виртуальная таблица FTS5, см. app.search)
+    """
+    product = models.OneToOneField(Product, verbose_name='Продукт', related_name='search',
+                                   primary_key=True, db_column='rowid', db_constraint=False,
+                                   on_delete=models.DO_NOTHING)
+    name = models.TextField(verbose_name='Название')
+    model_names = models.TextField(verbose_name='Модели', db_column='models')
+    parameters = models.TextField(verbose_name='Значения параметров')
+    document = SearchDocumentField(db_column=SEARCH_TABLE)
+    rank = models.FloatField(verbose_name='Ранг')
+    # Псевдоним rowid: сортировка по нему не требует соединения с товаром
+    position = models.IntegerField(verbose_name='Позиция', db_column='_rowid_')
+
+    class Meta:
+        managed = False
+        db_table = SEARCH_TABLE
+        verbose_name = 'Поисковый индекс товара'
+        verbose_name_plural = "Поисковый индекс товаров"
+
+
+class CatalogVersion(models.Model):
+    """
+    Счетчик изменений каталога: импорт увеличивает его при изменении товаров
+    и категорий, а кэши процесса (см. app.autocomplete) сверяют с ним версию
+    """
+    version = models.PositiveIntegerField(verbose_name='Версия', default=0)
+    updated_at = models.DateTimeField(verbose_name='Изменен', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Версия каталога'
+        verbose_name_plural = "Версия каталога"
+
+    def __str__(self):
+        return str(self.version)
 
 
 class Contact(models.Model):
@@ -224,6 +379,13 @@ class Order(models.Model):
         verbose_name = 'Заказ'
         verbose_name_plural = "Список заказ"
         ordering = ('-dt',)
+        indexes = [
+            models.Index(fields=['user', '-dt'], name='order_user_dt'),
+            models.Index(fields=['state', '-dt'], name='order_state_dt'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user'], condition=models.Q(state='basket'), name='unique_user_basket'),
+        ]
 
     def __str__(self):
         return str(self.dt)
@@ -253,6 +415,69 @@ class OrderItem(models.Model):
         ]
 
 
+class ImportJob(models.Model):
+    user = models.ForeignKey(User, verbose_name='Пользователь',
+                             related_name='import_jobs', blank=True,
+                             on_delete=models.CASCADE)
+    shop = models.ForeignKey(Shop, verbose_name='Магазин',
+                             related_name='import_jobs', blank=True, null=True,
+                             on_delete=models.SET_NULL)
+    url = models.URLField(verbose_name='Ссылка')
+    format = models.CharField(verbose_name='Формат прайса', choices=PRICE_LIST_FORMAT_CHOICES, max_length=10,
+                              blank=True)
+    dry_run = models.BooleanField(verbose_name='Только проверка', default=False)
+    state = models.CharField(verbose_name='Статус', choices=IMPORT_STATE_CHOICES, max_length=10, default='pending')
+    phase = models.CharField(verbose_name='Этап', max_length=20, blank=True)
+    rows_processed = models.PositiveIntegerField(verbose_name='Обработано товаров', default=0)
+    bytes_fetched = models.PositiveIntegerField(verbose_name='Загружено байт', default=0)
+    fetch_time = models.FloatField(verbose_name='Время загрузки, сек', blank=True, null=True)
+    connection_reused = models.BooleanField(verbose_name='Соединение из пула', blank=True, null=True)
+    stats = models.TextField(verbose_name='Статистика', blank=True)
+    error = models.TextField(verbose_name='Ошибка', blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = 'Задача импорта'
+        verbose_name_plural = "Список задач импорта"
+        ordering = ('-created_at',)
+        indexes = [
+            models.Index(fields=['state', 'id'], name='import_job_queue'),
+        ]
+
+    def __str__(self):
+        return f'{self.url} ({self.state})'
+
+
+class IdempotencyKey(models.Model):
+    """
+    Первый ответ на запрос с заголовком Idempotency-Key (см. app.idempotency)
+
+    Пока запрос выполняется, status пуст, а locked_at - время захвата ключа.
+    """
+    user = models.ForeignKey(User, verbose_name='Пользователь', related_name='+',
+                             on_delete=models.CASCADE)
+    key = models.CharField(verbose_name='Ключ', max_length=64)
+    status = models.PositiveSmallIntegerField(verbose_name='HTTP-статус ответа', blank=True, null=True)
+    body = models.TextField(verbose_name='Тело ответа', blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    locked_at = models.DateTimeField(verbose_name='Захвачен', default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Ключ идемпотентности'
+        verbose_name_plural = "Список ключей идемпотентности"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key'),
+        ]
+        indexes = [
+            models.Index(fields=['created_at'], name='idempotency_key_created'),
+        ]
+
+    def __str__(self):
+        return f'{self.key} ({self.status})'
+
+
 class ConfirmEmailToken(models.Model):
     class Meta:
         verbose_name = 'Токен подтверждения Email'
@@ -0,0 +1,41 @@
+from django.db.models import OuterRef, Subquery
+
+from app.models import Product, ProductInfo, BestOffer
+
+
+def refresh_best_offers(product_ids, batch_size=500):
+    """
+    Пересчет лучших предложений для указанных товаров
+
+    Лучшее предложение - самое дешевое с ненулевым остатком (при равной цене -
+    созданное раньше). Товары без предложений в наличии из таблицы удаляются.
+    Вызывается импортом для товаров, у которых изменились предложения.
+    """
+    product_ids = sorted(product_ids)
+    for start in range(0, len(product_ids), batch_size):
+        batch = product_ids[start:start + batch_size]
+        categories = dict(Product.objects.filter(id__in=batch).values_list('id', 'category_id'))
+
+        best_offers = {}
+        for product_info_id, product_id, shop_id, price in ProductInfo.objects.filter(
+                product_id__in=batch, quantity__gt=0,
+        ).order_by('product_id', 'price', 'id').values_list('id', 'product_id', 'shop_id', 'price'):
+            if product_id in best_offers:
+                best_offers[product_id].offer_count += 1
+            else:
+                best_offers[product_id] = BestOffer(product_id=product_id, category_id=categories[product_id],
+                                                    product_info_id=product_info_id, shop_id=shop_id,
+                                                    price=price, offer_count=1)
+
+        BestOffer.objects.filter(product_id__in=batch).delete()
+        BestOffer.objects.bulk_create(best_offers.values(), batch_size=batch_size)
+    return len(product_ids)
+
+
+def min_price(offers):
+    """
+    Минимальная цена предложений товара для аннотации queryset товаров
+
+    Подзапрос берет первую строку индекса (product, price).
+    """
+    return Subquery(offers.filter(product_id=OuterRef('pk')).order_by('price').values('price')[:1])
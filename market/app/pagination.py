@@ -0,0 +1,121 @@
+from collections import OrderedDict
+
+from rest_framework.pagination import PageNumberPagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class CatalogPageNumberPagination(PageNumberPagination):
+    """
+    Постраничный вывод с номером страницы
+
+    При count=false общее количество не считается: выбирается на одну
+    запись больше размера страницы, чтобы узнать, есть ли следующая.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    count_query_param = 'count'
+    count_by_default = True
+
+    def paginate_queryset(self, queryset, request, view=None):
+        count = request.query_params.get(self.count_query_param, '').lower()
+        self.skip_count = count in ('0', 'false') or (not self.count_by_default and count not in ('1', 'true'))
+        if not self.skip_count:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        try:
+            self.page_number = max(int(request.query_params.get(self.page_query_param, 1)), 1)
+        except ValueError:
+            self.page_number = 1
+
+        offset = (self.page_number - 1) * page_size
+        rows = list(queryset[offset:offset + page_size + 1])
+        self.has_next = len(rows) > page_size
+        return rows[:page_size]
+
+    def get_paginated_response(self, data):
+        if not self.skip_count:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_next_link(self):
+        if not self.skip_count:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.page_query_param, self.page_number + 1)
+
+    def get_previous_link(self):
+        if not self.skip_count:
+            return super().get_previous_link()
+        if self.page_number <= 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page_number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.page_number - 1)
+
+
+class SearchPageNumberPagination(CatalogPageNumberPagination):
+    """
+    Постраничный вывод результатов поиска по тексту
+
+    Общее количество найденного считается только при count=true.
+    """
+    count_by_default = False
+
+
+class ProductCursorPagination(CursorPagination):
+    """
+    Постраничный вывод товаров по ключу (keyset): без OFFSET и COUNT(*)
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = '-id'
+
+
+class ProductPriceCursorPagination(ProductCursorPagination):
+    """
+    Постраничный вывод товаров по ключу в порядке минимальной цены
+
+    Порядок задается параметром ordering (price или -price), queryset
+    должен содержать аннотации min_price и best_offer_pk (см. FindProductsView).
+    """
+    ordering = ('min_price', 'best_offer_pk')
+
+    def get_ordering(self, request, queryset, view):
+        if request.query_params.get('ordering') == '-price':
+            return ('-min_price', '-best_offer_pk')
+        return self.ordering
+
+
+class BestOfferCursorPagination(ProductCursorPagination):
+    """
+    Постраничный вывод лучших предложений по ключу, от дешевых к дорогим
+    """
+    ordering = ('price', 'product_id')
+
+
+class CatalogCursorPagination(ProductCursorPagination):
+    """
+    Постраничный вывод проекции каталога по ключу, от новых предложений к старым
+    """
+    ordering = '-pk'
+
+
+class OrderCursorPagination(ProductCursorPagination):
+    """
+    Постраничный вывод заказов по ключу, от новых к старым
+    """
+    ordering = '-dt'
@@ -0,0 +1,370 @@
+import codecs
+import csv
+import io
+import json
+import os
+import re
+from urllib.parse import urlparse
+
+from yaml.events import AliasEvent, ScalarEvent, SequenceStartEvent, SequenceEndEvent, MappingStartEvent, \
+    MappingEndEvent, StreamStartEvent, StreamEndEvent, DocumentStartEvent, DocumentEndEvent
+from yaml.nodes import ScalarNode, SequenceNode, MappingNode
+from yaml.composer import ComposerError
+
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
+# Количество товаров в одном пакете, передаваемом на запись
+BATCH_SIZE = 500
+
+
+def iter_price_list_document(data, batch_size=BATCH_SIZE):
+    """
+    Разбиение загруженного в память прайса на записи импорта
+    """
+    yield 'shop', data['shop']
+    yield 'categories', data['categories']
+    goods = data['goods']
+    for start in range(0, len(goods), batch_size):
+        yield 'goods', goods[start:start + batch_size]
+
+
+class YamlPriceListReader:
+    """
+    Потоковое чтение прайса в формате YAML
+
+    Документ разбирается по событиям парсера: разделы shop и categories
+    строятся целиком, а товары из раздела goods собираются по одному и
+    отдаются пакетами, поэтому объем памяти не зависит от размера файла.
+    Если доступна libyaml, используется C-парсер.
+    """
+
+    def __init__(self, stream, batch_size=BATCH_SIZE):
+        self.loader = YamlLoader(stream)
+        self.batch_size = batch_size
+        self.anchors = {}
+
+    def __iter__(self):
+        try:
+            self.expect(StreamStartEvent)
+            self.expect(DocumentStartEvent)
+            self.expect(MappingStartEvent)
+            while not self.loader.check_event(MappingEndEvent):
+                key = self.read_object()
+                if key == 'goods' and self.loader.check_event(SequenceStartEvent):
+                    yield from self.read_goods()
+                elif key == 'goods':
+                    goods = self.read_object() or []
+                    for start in range(0, len(goods), self.batch_size):
+                        yield 'goods', goods[start:start + self.batch_size]
+                elif key in ('shop', 'categories'):
+                    yield key, self.read_object()
+                else:
+                    self.read_object()
+            self.expect(MappingEndEvent)
+            self.expect(DocumentEndEvent)
+            self.expect(StreamEndEvent)
+        finally:
+            self.loader.dispose()
+
+    def read_goods(self):
+        self.expect(SequenceStartEvent)
+        batch = []
+        while not self.loader.check_event(SequenceEndEvent):
+            batch.append(self.read_object())
+            if len(batch) >= self.batch_size:
+                yield 'goods', batch
+                batch = []
+        self.expect(SequenceEndEvent)
+        if batch:
+            yield 'goods', batch
+
+    def expect(self, event_class):
+        event = self.loader.get_event()
+        if not isinstance(event, event_class):
+            raise ComposerError(None, None, f'expected {event_class.__name__}, but found {event.__class__.__name__}',
+                                event.start_mark)
+        return event
+
+    def read_object(self):
+        return self.loader.construct_document(self.compose())
+
+    def compose(self):
+        """
+        Построение узла YAML из очередной порции событий
+        """
+        event = self.loader.get_event()
+        if isinstance(event, AliasEvent):
+            if event.anchor not in self.anchors:
+                raise ComposerError(None, None, f'found undefined alias {event.anchor}', event.start_mark)
+            return self.anchors[event.anchor]
+
+        if isinstance(event, ScalarEvent):
+            tag = event.tag
+            if tag is None or tag == '!':
+                tag = self.loader.resolve(ScalarNode, event.value, event.implicit)
+            node = ScalarNode(tag, event.value, event.start_mark, event.end_mark, style=event.style)
+        elif isinstance(event, SequenceStartEvent):
+            tag = event.tag
+            if tag is None or tag == '!':
+                tag = self.loader.resolve(SequenceNode, None, event.implicit)
+            node = SequenceNode(tag, [], event.start_mark, None, flow_style=event.flow_style)
+            while not self.loader.check_event(SequenceEndEvent):
+                node.value.append(self.compose())
+            node.end_mark = self.loader.get_event().end_mark
+        elif isinstance(event, MappingStartEvent):
+            tag = event.tag
+            if tag is None or tag == '!':
+                tag = self.loader.resolve(MappingNode, None, event.implicit)
+            node = MappingNode(tag, [], event.start_mark, None, flow_style=event.flow_style)
+            while not self.loader.check_event(MappingEndEvent):
+                key = self.compose()
+                node.value.append((key, self.compose()))
+            node.end_mark = self.loader.get_event().end_mark
+        else:
+            raise ComposerError(None, None, f'unexpected {event.__class__.__name__}', event.start_mark)
+
+        if event.anchor is not None:
+            self.anchors[event.anchor] = node
+        return node
+
+
+def iter_yaml_price_list(stream, batch_size=BATCH_SIZE):
+    """
+    Потоковое чтение прайса в формате YAML
+    """
+    return iter(YamlPriceListReader(stream, batch_size=batch_size))
+
+
+class JsonPriceListReader:
+    """
+    Потоковое чтение прайса в формате JSON
+
+    Верхний уровень документа разбирается вручную, а значения извлекаются
+    JSONDecoder.raw_decode из буфера, который пополняется по мере чтения.
+    Элементы массива goods отдаются пакетами, не загружая весь документ.
+    """
+
+    chunk_size = 64 * 1024
+    whitespace = re.compile(r'\s*')
+
+    def __init__(self, stream, batch_size=BATCH_SIZE):
+        self.stream = stream
+        self.batch_size = batch_size
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def __iter__(self):
+        self.expect('{')
+        while self.peek() != '}':
+            key = self.read_value()
+            self.expect(':')
+            if key == 'goods' and self.peek() == '[':
+                yield from self.read_goods()
+            elif key == 'goods':
+                goods = self.read_value() or []
+                for start in range(0, len(goods), self.batch_size):
+                    yield 'goods', goods[start:start + self.batch_size]
+            elif key in ('shop', 'categories'):
+                yield key, self.read_value()
+            else:
+                self.read_value()
+            if self.peek() == ',':
+                self.expect(',')
+        self.expect('}')
+
+    def read_goods(self):
+        self.expect('[')
+        batch = []
+        while self.peek() != ']':
+            batch.append(self.read_value())
+            if len(batch) >= self.batch_size:
+                yield 'goods', batch
+                batch = []
+            if self.peek() == ',':
+                self.expect(',')
+        self.expect(']')
+        if batch:
+            yield 'goods', batch
+
+    def fill(self):
+        if self.eof:
+            return False
+        chunk = self.stream.read(self.chunk_size)
+        # Конец потока определяется по прочитанным байтам: порция из части
+        # многобайтового символа декодируется в пустую строку
+        self.eof = not chunk
+        if isinstance(chunk, bytes):
+            chunk = self.text_decoder.decode(chunk, final=self.eof)
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return not self.eof
+
+    def peek(self):
+        while True:
+            self.pos = self.whitespace.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) or not self.fill():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise json.JSONDecodeError(f'Expecting {char!r}', self.buffer, self.pos)
+        self.pos += 1
+
+    def read_value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # Число в конце буфера может продолжаться в следующей порции
+            if end == len(self.buffer) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_price_list(stream, batch_size=BATCH_SIZE):
+    """
+    Потоковое чтение прайса в формате JSON
+    """
+    return iter(JsonPriceListReader(stream, batch_size=batch_size))
+
+
+def iter_ndjson_price_list(stream, batch_size=BATCH_SIZE):
+    """
+    Чтение прайса в формате NDJSON: по одному JSON-объекту в строке
+
+    Строка с ключом shop (и, при необходимости, categories) задает магазин
+    и категории, остальные строки - товары.
+    """
+    batch = []
+    for line in stream:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8-sig')
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if 'shop' in record:
+            yield 'shop', record['shop']
+            if 'categories' in record:
+                yield 'categories', record['categories']
+        else:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                yield 'goods', batch
+                batch = []
+    if batch:
+        yield 'goods', batch
+
+
+def iter_csv_price_list(stream, batch_size=BATCH_SIZE):
+    """
+    Чтение прайса в формате CSV: по одному товару в строке
+
+    Колонки: shop, category, category_name, id, model, name, price,
+    price_rrc, quantity, а параметры товара - колонки вида parameters.<имя>.
+    Магазин берется из первой строки, категории - из колонок category и
+    category_name и передаются перед пакетом, в котором впервые встретились.
+    Название категории обязательно: берется первое непустое значение
+    category_name, а категория без названия не проходит проверку прайса.
+    """
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(stream)
+    parameter_columns = [(column, column[len('parameters.'):]) for column in reader.fieldnames or []
+                         if column.startswith('parameters.')]
+
+    shop = None
+    categories = {}
+    new_categories = []
+    batch = []
+    for row in reader:
+        if shop is None:
+            shop = row['shop']
+            yield 'shop', shop
+
+        category_id = int(row['category'])
+        category_name = (row.get('category_name') or '').strip()
+        if category_id not in categories:
+            categories[category_id] = {'id': category_id, 'name': category_name}
+            new_categories.append(categories[category_id])
+        elif category_name and not categories[category_id]['name']:
+            categories[category_id]['name'] = category_name
+
+        batch.append({
+            'id': int(row['id']),
+            'category': category_id,
+            'model': row['model'],
+            'name': row['name'],
+            'price': int(row['price']),
+            'price_rrc': int(row['price_rrc']),
+            'quantity': int(row['quantity']),
+            'parameters': {name: row[column] for column, name in parameter_columns if row[column] != ''},
+        })
+        if len(batch) >= batch_size:
+            yield 'categories', new_categories
+            yield 'goods', batch
+            new_categories, batch = [], []
+    if batch:
+        yield 'categories', new_categories
+        yield 'goods', batch
+
+
+PARSERS = {
+    'yaml': iter_yaml_price_list,
+    'json': iter_json_price_list,
+    'ndjson': iter_ndjson_price_list,
+    'csv': iter_csv_price_list,
+}
+
+CONTENT_TYPES = {
+    'application/x-yaml': 'yaml',
+    'application/yaml': 'yaml',
+    'text/yaml': 'yaml',
+    'text/x-yaml': 'yaml',
+    'application/json': 'json',
+    'application/x-ndjson': 'ndjson',
+    'application/ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+    'application/x-jsonlines': 'ndjson',
+    'text/csv': 'csv',
+}
+
+EXTENSIONS = {
+    '.yaml': 'yaml',
+    '.yml': 'yaml',
+    '.json': 'json',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+    '.csv': 'csv',
+}
+
+
+def detect_format(content_type='', name=''):
+    """
+    Определение формата прайса по типу содержимого или расширению файла
+
+    Неизвестные типы (например, application/octet-stream) пропускаются,
+    по умолчанию используется YAML.
+    """
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if content_type in CONTENT_TYPES:
+        return CONTENT_TYPES[content_type]
+    extension = os.path.splitext(urlparse(name or '').path)[1].lower()
+    return EXTENSIONS.get(extension, 'yaml')
+
+
+def iter_price_list(stream, price_list_format='yaml', batch_size=BATCH_SIZE):
+    """
+    Чтение прайса в указанном формате
+    """
+    return PARSERS[price_list_format](stream, batch_size=batch_size)
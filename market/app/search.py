@@ -0,0 +1,136 @@
+import re
+
+from django.db import connection, models
+
+# Таблица полнотекстового индекса товаров (SQLite FTS5), rowid = ИД товара
+SEARCH_TABLE = 'app_product_search'
+
+CREATE_SQL = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+    name, models, parameters,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+"""
+
+DROP_SQL = f'DROP TABLE IF EXISTS {SEARCH_TABLE}'
+
+# Документ товара: название, модели всех предложений и значения их параметров
+INSERT_SQL = f"""
+INSERT INTO {SEARCH_TABLE} (rowid, name, models, parameters)
+SELECT p.id, p.name,
+       (SELECT group_concat(pi.model, ' ') FROM app_productinfo pi WHERE pi.product_id = p.id),
+       (SELECT group_concat(DISTINCT pp.value)
+          FROM app_productparameter pp
+          JOIN app_productinfo pi ON pp.product_info_id = pi.id
+         WHERE pi.product_id = p.id)
+  FROM app_product p
+"""
+
+# Веса колонок name, models, parameters при ранжировании (bm25)
+RANK_SQL = f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rank) VALUES ('rank', 'bm25(10.0, 5.0, 1.0)')"
+
+# Максимальное количество совпадений, которые упорядочиваются по релевантности
+RANK_LIMIT = 1000
+
+WORD_RE = re.compile(r'\w+')
+
+
+class SearchDocumentField(models.TextField):
+    """
+    Скрытая колонка FTS5 с именем таблицы: условие MATCH по всем колонкам
+    """
+
+
+@SearchDocumentField.register_lookup
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+def is_available(using=connection):
+    return using.vendor == 'sqlite'
+
+
+def create_index(apps, schema_editor):
+    """
+    Создание и заполнение индекса (операция миграции, только для SQLite)
+    """
+    if not is_available(schema_editor.connection):
+        return
+    schema_editor.execute(CREATE_SQL)
+    schema_editor.execute(RANK_SQL)
+    schema_editor.execute(INSERT_SQL)
+
+
+def drop_index(apps, schema_editor):
+    if is_available(schema_editor.connection):
+        schema_editor.execute(DROP_SQL)
+
+
+def index_products(product_ids, batch_size=500):
+    """
+    Пересчет документов индекса для указанных товаров
+
+    Вызывается импортом для товаров, у которых изменились предложения
+    или значения параметров.
+    """
+    if not is_available():
+        return 0
+    product_ids = sorted(product_ids)
+    with connection.cursor() as cursor:
+        for start in range(0, len(product_ids), batch_size):
+            batch = product_ids[start:start + batch_size]
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})', batch)
+            cursor.execute(f'{INSERT_SQL} WHERE p.id IN ({placeholders})', batch)
+    return len(product_ids)
+
+
+def build_query(text):
+    """
+    Запрос FTS5 из строки поиска: все слова обязательны, последнее - как префикс
+
+    "iphone xr 25" -> "iphone" "xr" "25"*
+    """
+    words = [f'"{word}"' for word in WORD_RE.findall(text.lower())]
+    if words:
+        words[-1] += '*'
+    return ' '.join(words)
+
+
+def count_matches(query, limit):
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT count(*) FROM (SELECT 1 FROM {SEARCH_TABLE} '
+                       f'WHERE {SEARCH_TABLE} MATCH %s LIMIT %s)', [query, limit])
+        return cursor.fetchone()[0]
+
+
+def search_products(products, text, ordered=True):
+    """
+    Товары, подходящие под строку поиска, по убыванию релевантности
+
+    При ordered=False порядок не задается (для подзапросов).
+    Ранг bm25 считается для каждого совпадения, поэтому при числе совпадений
+    больше RANK_LIMIT (слишком общий запрос) товары упорядочиваются от новых
+    к старым: такой порядок FTS5 отдает без сортировки.
+
+    Без FTS5 (не SQLite) каждое слово ищется вхождением в название или модель.
+    """
+    query = build_query(text)
+    if not query:
+        return products
+    if is_available():
+        products = products.filter(search__document__match=query)
+        if not ordered:
+            return products
+        if count_matches(query, RANK_LIMIT + 1) > RANK_LIMIT:
+            return products.order_by('-search__position')
+        return products.order_by('search__rank', 'id')
+    for word in WORD_RE.findall(text):
+        products = products.filter(models.Q(name__icontains=word) | models.Q(product_infos__model__icontains=word))
+    return products.distinct().order_by('id') if ordered else products
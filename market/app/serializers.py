@@ -1,6 +1,10 @@
+import json
+
+from django.db.models import Prefetch
+from django.utils import timezone
 from rest_framework import serializers
 from app.models import Shop, Product, ProductInfo, User, Contact, ConfirmEmailToken, Order,\
-    OrderItem, Category
+    OrderItem, Category, ImportJob, BestOffer, CatalogEntry
 
 
 class ContactSerializer(serializers.ModelSerializer):
@@ -45,12 +49,54 @@ class ProductSerializer(serializers.ModelSerializer):
         model = Product
         fields = ('id', 'name', 'category', 'product_infos')
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Загрузка связанных данных, которые выводит сериализатор, фиксированным числом запросов
+        """
+        return queryset.prefetch_related(Prefetch('product_infos', queryset=ProductInfo.objects.order_by('pk')))
+
+
+class BestOfferSerializer(serializers.ModelSerializer):
+    name = serializers.CharField(source='product.name', read_only=True)
+    shop_name = serializers.CharField(source='shop.name', read_only=True)
+
+    class Meta:
+        model = BestOffer
+        fields = ('product', 'name', 'category', 'shop', 'shop_name', 'product_info', 'price', 'offer_count')
+        read_only_fields = fields
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('product', 'shop')
+
+
+class CatalogEntrySerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='pk', read_only=True)
+    parameters = serializers.SerializerMethodField()
+
+    class Meta:
+        model = CatalogEntry
+        fields = ('id', 'product', 'product_name', 'category', 'category_name', 'shop', 'shop_name',
+                  'model', 'external_id', 'price', 'price_rrc', 'quantity', 'parameters')
+        read_only_fields = fields
+
+    def get_parameters(self, obj):
+        """
+        Параметры предложения из сохраненного JSON
+        """
+        return json.loads(obj.parameters)
+
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ('id', 'name', 'shops')
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.prefetch_related('shops')
+
 
 class OrderSerializer(serializers.ModelSerializer):
     # ordered_items = OrderItemCreateSerializer(read_only=True, many=True)
@@ -80,3 +126,35 @@ class OrderSerializer(serializers.ModelSerializer):
         model = Order
         fields = ('id', 'ordered_items', 'state', 'dt', 'contact',)
         read_only_fields = ('id',)
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('contact').prefetch_related(
+            Prefetch('ordered_items', queryset=OrderItem.objects.order_by('pk')))
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    throughput = serializers.SerializerMethodField()
+    stats = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ImportJob
+        fields = ('id', 'url', 'format', 'dry_run', 'shop', 'state', 'phase', 'rows_processed', 'throughput',
+                  'error', 'stats',
+                  'bytes_fetched', 'fetch_time', 'connection_reused', 'created_at', 'started_at', 'finished_at')
+        read_only_fields = fields
+
+    def get_throughput(self, obj):
+        """
+        Скорость импорта, товаров в секунду
+        """
+        if not obj.started_at:
+            return None
+        elapsed = ((obj.finished_at or timezone.now()) - obj.started_at).total_seconds()
+        return round(obj.rows_processed / elapsed, 1) if elapsed > 0 else None
+
+    def get_stats(self, obj):
+        """
+        Статистика импорта или отчет о проверке прайса
+        """
+        return json.loads(obj.stats) if obj.stats else None
@@ -1,3 +1,759 @@
-from django.test import TestCase
+import copy
+import csv
+import io
+import json
+import os
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import yaml
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction, OperationalError
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from app.basket import place_order, get_summary, invalidate_summary, invalidate_summaries
+from app.models import Shop, Category, Product, ProductInfo, Parameter, ProductParameter, User, Contact, \
+    Order, OrderItem, IdempotencyKey, ImportJob, BestOffer, CatalogEntry
+from app.importer import import_price_list, PriceListImporter, ShopImportBusy
+from app.fetcher import FetchResult
+from app.jobs import claim_next_job, run_import_job
+from app.offers import refresh_best_offers
+from app.parsers import iter_price_list_document, iter_price_list, JsonPriceListReader
+from app.validation import validate_price_list, MAX_POSITIVE_INTEGER
+
+# Прайс из примеров проекта
+PRICE_LIST = os.path.join(settings.BASE_DIR, os.pardir, 'data', 'shop1.yaml')
+
+
+class QueryCountTest(TestCase):
+    """
+    Число запросов эндпоинтов чтения не зависит от количества объектов в ответе
+
+    Каждый эндпоинт вызывается на наборах из 2 и 50 объектов: на первом
+    число запросов измеряется, на втором проверяется assertNumQueries.
+    """
+    sizes = (2, 50)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.parameter = Parameter.objects.create(name='Цвет')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.login('buyer')
+
+    def login(self, username):
+        user = User.objects.create_user(f'{username}@example.com', 'password', username=username, is_active=True)
+        self.client.force_authenticate(user)
+        return user
+
+    def create_catalog(self, size):
+        """
+        Категория с size товарами; у каждого товара по предложению в двух магазинах
+        """
+        category = Category.objects.create(name=f'Категория {size}')
+        shops = [Shop.objects.create(name=f'Магазин {size}-{number}') for number in range(2)]
+        category.shops.set(shops)
+        for number in range(size):
+            product = Product.objects.create(name=f'Товар {number}', category=category)
+            for shop in shops:
+                product_info = ProductInfo.objects.create(product=product, shop=shop, external_id=number,
+                                                          model=f'M{number}', price=100 + number,
+                                                          price_rrc=200, quantity=5)
+                ProductParameter.objects.create(product_info=product_info, parameter=self.parameter, value='черный')
+        return category, shops
+
+    def get(self, url, params, expected):
+        """
+        GET-запрос: (ответ, число запросов к БД)
+
+        Без expected число запросов измеряется, иначе проверяется.
+        """
+        if expected is None:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url, params)
+            expected = len(context.captured_queries)
+        else:
+            with self.assertNumQueries(expected):
+                response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response, expected
+
+    def test_find_products(self):
+        expected = None
+        for size in self.sizes:
+            category, _ = self.create_catalog(size)
+            response, expected = self.get('/api/v1/app/products/find',
+                                          {'category_id': category.id, 'page_size': 100}, expected)
+            self.assertEqual(len(response.data['results']), size)
+
+    def test_find_products_by_offers(self):
+        expected = None
+        for size in self.sizes:
+            category, shops = self.create_catalog(size)
+            response, expected = self.get('/api/v1/app/products/find',
+                                          {'category_id': category.id, 'shop_id': shops[0].id, 'max_price': 1000,
+                                           'expand': 'product_infos', 'page_size': 100}, expected)
+            self.assertEqual(len(response.data['results']), size)
+
+    def test_get_product(self):
+        expected = None
+        for size in self.sizes:
+            category = Category.objects.create(name=f'Категория {size}')
+            product = Product.objects.create(name='Товар', category=category)
+            for number in range(size):
+                shop = Shop.objects.create(name=f'Магазин {size}-{number}')
+                ProductInfo.objects.create(product=product, shop=shop, external_id=number, model='M',
+                                           price=100, price_rrc=200, quantity=5)
+            response, expected = self.get(f'/api/v1/app/products/get/{product.id}',
+                                          {'expand': 'product_infos'}, expected)
+            self.assertEqual(len(response.data['product_infos']), size)
+
+    def test_categories(self):
+        expected = None
+        for size in self.sizes:
+            Category.objects.all().delete()
+            shops = [Shop.objects.create(name=f'Магазин {size}-{number}') for number in range(2)]
+            for number in range(size):
+                Category.objects.create(name=f'Категория {number}').shops.set(shops)
+            response, expected = self.get('/api/v1/app/category', {'page_size': 100}, expected)
+            self.assertEqual(len(response.data['results']), size)
+
+    def test_orders(self):
+        expected = None
+        for size in self.sizes:
+            user = self.login(f'buyer{size}')
+            contact = Contact.objects.create(user=user, city='Москва', street='Ленина', phone='+70000000000')
+            _, shops = self.create_catalog(2)
+            product_infos = list(ProductInfo.objects.filter(shop__in=shops))
+            for _ in range(size):
+                order = Order.objects.create(user=user, state='new', contact=contact)
+                OrderItem.objects.bulk_create([OrderItem(order=order, product_info=product_info, quantity=1)
+                                               for product_info in product_infos])
+            response, expected = self.get('/api/v1/app/orders',
+                                          {'expand': 'ordered_items,contact', 'page_size': 100}, expected)
+            self.assertEqual(len(response.data['results']), size)
+
+
+class FindProductsFacetsTest(TestCase):
+    """
+    Фасеты поиска описывают выборку с фильтром по цене, а при откате на индекс помечаются
+    """
+    @classmethod
+    def setUpTestData(cls):
+        parameter = Parameter.objects.create(name='Цвет')
+        category = Category.objects.create(name='Категория')
+        shop = Shop.objects.create(name='Магазин')
+        for number in range(5):
+            product = Product.objects.create(name=f'Товар {number}', category=category)
+            product_info = ProductInfo.objects.create(product=product, shop=shop, external_id=number, model='M',
+                                                      price=100 + number, price_rrc=200, quantity=5)
+            ProductParameter.objects.create(product_info=product_info, parameter=parameter, value='черный')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('buyer@example.com', 'password', is_active=True))
+
+    def find(self, **params):
+        response = self.client.get('/api/v1/app/products/find', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data
+
+    def test_price_filter(self):
+        data = self.find(max_price=101)
+        self.assertTrue(data['facets_filtered'])
+        self.assertEqual([value['count'] for facet in data['facets'] for value in facet['values']], [2])
+        self.assertEqual(self.find(max_price=10)['facets'], [])
+
+    def test_index_fallback(self):
+        with self.settings(FACET_LIVE_LIMIT=1):
+            self.assertFalse(self.find(max_price=101)['facets_filtered'])
+
+
+class PriceOrderingTest(TestCase):
+    """
+    Сортировка поиска по цене лучшего предложения в наличии с постраничным выводом по ключу
+    """
+    prices = (130, 110, 110, 120, 100)
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Категория')
+        shop, other_shop = Shop.objects.create(name='Магазин'), Shop.objects.create(name='Другой магазин')
+        cls.products = []
+        for number, price in enumerate(cls.prices):
+            product = Product.objects.create(name=f'Товар {number}', category=category)
+            ProductInfo.objects.create(product=product, shop=shop, external_id=number, model='M',
+                                       price=price, price_rrc=200, quantity=5)
+            ProductInfo.objects.create(product=product, shop=other_shop, external_id=number, model='M',
+                                       price=price - 50, price_rrc=200, quantity=0)
+            cls.products.append(product.id)
+        product = Product.objects.create(name='Нет в наличии', category=category)
+        ProductInfo.objects.create(product=product, shop=shop, external_id=10, model='M',
+                                   price=1, price_rrc=200, quantity=0)
+        refresh_best_offers(Product.objects.values_list('id', flat=True))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('buyer@example.com', 'password', is_active=True))
+
+    def find(self, **params):
+        """
+        Все страницы выдачи: [(id, min_price)]
+        """
+        rows = []
+        response = self.client.get('/api/v1/app/products/find', {'page_size': 2, 'fields': 'id,min_price', **params})
+        while True:
+            self.assertEqual(response.status_code, 200, response.content)
+            rows += [(item['id'], item['min_price']) for item in response.data['results']]
+            if not response.data['next']:
+                return rows
+            response = self.client.get(response.data['next'])
+
+    def expected(self, reverse=False, min_price=0):
+        rows = sorted(zip(self.products, self.prices), key=lambda row: (row[1], row[0]), reverse=reverse)
+        return [row for row in rows if row[1] >= min_price]
+
+    def test_ordering(self):
+        self.assertEqual(self.find(ordering='price'), self.expected())
+        self.assertEqual(self.find(ordering='-price'), self.expected(reverse=True))
+
+    def test_ordering_with_filter(self):
+        self.assertEqual(self.find(ordering='price', min_price=115), self.expected(min_price=115))
+
+
+class PlaceOrderContentionTest(TransactionTestCase):
+    """
+    Параллельное размещение заказов с общим товаром, которого хватает не всем
+
+    Потоки работают через собственные соединения с той же тестовой БД
+    (для SQLite - общая память с общим кэшем).
+    """
+    buyers = 24
+    threads = 8
+    stock = 5
+    attempts = 1000
+
+    def setUp(self):
+        shop = Shop.objects.create(name='Магазин')
+        category = Category.objects.create(name='Категория')
+        self.hot, other = [
+            ProductInfo.objects.create(product=Product.objects.create(name=f'Товар {number}', category=category),
+                                       shop=shop, external_id=number, model='', price=100, price_rrc=100,
+                                       quantity=quantity)
+            for number, quantity in enumerate((self.stock, self.buyers))
+        ]
+        self.baskets = []
+        for number in range(self.buyers):
+            user = User.objects.create_user(f'buyer{number}@example.com', 'password', username=f'buyer{number}',
+                                            is_active=True)
+            contact = Contact.objects.create(user=user, city='Москва', street='Ленина', phone='+70000000000')
+            basket = Order.objects.create(user=user, state='basket')
+            OrderItem.objects.bulk_create([OrderItem(order=basket, product_info=product_info, quantity=1)
+                                           for product_info in (self.hot, other)])
+            self.baskets.append((basket.id, contact.id))
+
+    def test_no_oversell(self):
+        results = []
+        lock = threading.Lock()
+
+        def worker(baskets):
+            try:
+                for basket_id, contact_id in baskets:
+                    for _ in range(self.attempts):
+                        try:
+                            outcome = 'placed' if not place_order(basket_id, contact_id) else 'shortage'
+                            break
+                        except OperationalError as e:
+                            # Общая память SQLite не ждет блокировку, а сразу отвечает "locked": повтор как у клиента
+                            outcome = f'failed: {e}'
+                            if 'locked' not in str(e):
+                                break
+                            time.sleep(0.001)
+                    with lock:
+                        results.append(outcome)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker, args=(self.baskets[number::self.threads],))
+                   for number in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        self.assertEqual(len(results), self.buyers)
+        self.assertEqual(results.count('placed'), self.stock, results)
+        self.assertEqual(results.count('shortage'), self.buyers - self.stock, results)
+
+        remaining = ProductInfo.objects.get(id=self.hot.id).quantity
+        ordered = OrderItem.objects.filter(product_info=self.hot, order__state='new').count()
+        self.assertEqual(remaining + ordered, self.stock)
+        self.assertEqual(remaining, 0)
+        self.assertEqual(Order.objects.filter(state='basket').count(), self.buyers - self.stock)
+
+
+class BasketSummaryCacheTest(TransactionTestCase):
+    """
+    Сводка корзины из кэша читается без запросов к БД и сбрасывается изменениями
+
+    Сброс выполняется после фиксации транзакции, поэтому тест работает в autocommit.
+    """
+
+    def setUp(self):
+        caches[settings.BASKET_SUMMARY_CACHE].clear()
+        self.user = User.objects.create_user('buyer@example.com', 'password', username='buyer', is_active=True)
+        category = Category.objects.create(name='Категория')
+        shop = Shop.objects.create(name='Магазин')
+        self.product_info = ProductInfo.objects.create(
+            product=Product.objects.create(name='Товар', category=category), shop=shop, external_id=1,
+            model='', price=100, price_rrc=100, quantity=10)
+        self.basket = Order.objects.create(user=self.user, state='basket')
+        OrderItem.objects.create(order=self.basket, product_info=self.product_info, quantity=2)
+
+    def test_hit_without_queries(self):
+        self.assertEqual(get_summary(self.user.id), {'lines': 1, 'total_quantity': 2, 'total_sum': 200})
+        with self.assertNumQueries(0):
+            self.assertEqual(get_summary(self.user.id)['total_sum'], 200)
+
+    def test_invalidate_summary(self):
+        get_summary(self.user.id)
+        OrderItem.objects.filter(order=self.basket).update(quantity=3)
+        invalidate_summary(self.user.id)
+        self.assertEqual(get_summary(self.user.id)['total_quantity'], 3)
+
+    def test_invalidate_summaries(self):
+        get_summary(self.user.id)
+        ProductInfo.objects.filter(id=self.product_info.id).update(price=150)
+        invalidate_summaries()
+        self.assertEqual(get_summary(self.user.id)['total_sum'], 300)
+
+
+class BasketTest(TestCase):
+    """
+    Добавление, изменение и удаление позиций корзины
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('buyer@example.com', 'password', username='buyer', is_active=True)
+        category = Category.objects.create(name='Категория')
+        shop = Shop.objects.create(name='Магазин')
+        self.product_infos = [
+            ProductInfo.objects.create(product=Product.objects.create(name=f'Товар {number}', category=category),
+                                       shop=shop, external_id=number, model='', price=100, price_rrc=100, quantity=5)
+            for number in range(2)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def request(self, method, items):
+        response = getattr(self.client, method)('/api/v1/app/basket', {'items': items}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def lines(self):
+        return dict(OrderItem.objects.filter(order__user=self.user, order__state='basket').values_list(
+            'product_info_id', 'quantity'))
+
+    def test_add(self):
+        first, second = (product_info.id for product_info in self.product_infos)
+        self.assertEqual(self.request('post', [{'product_info': first, 'quantity': 2}]), {'Status': True})
+        self.assertEqual(self.request('post', [{'product_info': first, 'quantity': 1},
+                                               {'product_info': second, 'quantity': 1}]), {'Status': True})
+        self.assertEqual(self.lines(), {first: 3, second: 1})
+        self.assertEqual(Order.objects.filter(user=self.user, state='basket').count(), 1)
+
+    def test_add_errors(self):
+        first, second = (product_info.id for product_info in self.product_infos)
+        response = self.request('post', [{'product_info': first, 'quantity': 6},
+                                         {'product_info': second + 1, 'quantity': 1}])
+        self.assertEqual(response, {'Status': False, 'Errors': {
+            '0': 'Недостаточно товара: в наличии 5, в корзине 6', '1': 'Предложение не найдено'}})
+        self.assertFalse(Order.objects.filter(user=self.user).exists())
+
+    def test_update(self):
+        first, second = (product_info.id for product_info in self.product_infos)
+        self.request('post', [{'product_info': first, 'quantity': 1}])
+        response = self.request('put', [{'product_info': first, 'quantity': 4},
+                                        {'product_info': second, 'quantity': 1}])
+        self.assertEqual(response['Updated items'], [first])
+        self.assertEqual(response['Unupdated items'][0]['Error'], 'Товара нет в корзине')
+        self.assertEqual(self.request('put', [{'product_info': first, 'quantity': 6}])['Unupdated items'][0]['Error'],
+                         'Недостаточно товара: в наличии 5')
+        self.assertEqual(self.lines(), {first: 4})
+
+    def test_delete(self):
+        first, second = (product_info.id for product_info in self.product_infos)
+        self.request('post', [{'product_info': first, 'quantity': 1}, {'product_info': second, 'quantity': 1}])
+        line = OrderItem.objects.get(product_info_id=first).id
+        response = self.request('delete', f'{line},0')
+        self.assertEqual(response['Deleted items'], [line])
+        self.assertEqual(response['Undeleted items'], {'0': 'Позиция не найдена в корзине'})
+        self.assertEqual(self.lines(), {second: 1})
+
+
+class IdempotentOrderTest(TestCase):
+    """
+    Размещение заказа с заголовком Idempotency-Key
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('buyer@example.com', 'password', username='buyer', is_active=True)
+        self.contact = Contact.objects.create(user=self.user, city='Москва', street='Ленина', phone='+70000000000')
+        category = Category.objects.create(name='Категория')
+        self.product_info = ProductInfo.objects.create(
+            product=Product.objects.create(name='Товар', category=category), shop=Shop.objects.create(name='Магазин'),
+            external_id=1, model='', price=100, price_rrc=100, quantity=10)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def fill_basket(self):
+        basket = Order.objects.create(user=self.user, state='basket')
+        OrderItem.objects.create(order=basket, product_info=self.product_info, quantity=1)
+
+    def place(self, key):
+        return self.client.post('/api/v1/app/orders', {'contact': self.contact.id}, HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_replay(self):
+        self.fill_basket()
+        first = self.place('key-1')
+        self.assertEqual(first.json(), {'Status': True, 'Errors': 'Заказ размещен'})
+        self.fill_basket()
+        retry = self.place('key-1')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.filter(user=self.user, state='basket').count(), 1)
+        self.assertEqual(ProductInfo.objects.get(id=self.product_info.id).quantity, 9)
+
+    def test_in_flight(self):
+        IdempotencyKey.objects.create(user=self.user, key='key-1')
+        self.fill_basket()
+        self.assertEqual(self.place('key-1').status_code, 409)
+        self.assertEqual(Order.objects.get(user=self.user).state, 'basket')
+
+    def test_stalled_key_is_taken_over(self):
+        IdempotencyKey.objects.create(
+            user=self.user, key='key-1',
+            locked_at=timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_LEASE + 1))
+        self.fill_basket()
+        response = self.place('key-1')
+        self.assertEqual(response.json(), {'Status': True, 'Errors': 'Заказ размещен'})
+        self.assertEqual(IdempotencyKey.objects.get(user=self.user, key='key-1').status, 200)
+
+
+class ImportSyncTest(TestCase):
+    """
+    Повторный импорт прайса (sync=True) записывает только изменения
+
+    Прайс из data/shop1.yaml импортируется, затем импортируется повторно
+    без изменений или с одной правкой.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('shop@example.com', 'password', username='shop', type='shop',
+                                             is_active=True)
+        with open(PRICE_LIST, 'rb') as stream:
+            self.data = yaml.safe_load(stream)
+        self.run_import(self.data)
+        self.shop = Shop.objects.get(user=self.user)
+
+    def run_import(self, data):
+        """
+        Импорт прайса: (счетчики импорта, SQL запросов на запись)
+        """
+        with CaptureQueriesContext(connection) as context:
+            stats = PriceListImporter(self.user.id).run(iter_price_list_document(copy.deepcopy(data)))
+        writes = [query['sql'] for query in context.captured_queries
+                  if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+        return stats.counts, writes
+
+    def offer(self, external_id):
+        return ProductInfo.objects.get(shop=self.shop, external_id=external_id)
+
+    def test_noop(self):
+        with self.assertNumQueries(11):
+            counts, writes = self.run_import(self.data)
+        self.assertEqual(writes, [])
+        self.assertEqual(counts['product_infos_unchanged'], len(self.data['goods']))
+        for name in ('categories_updated', 'product_infos_created', 'product_infos_updated', 'product_infos_deleted',
+                     'product_parameters_created', 'product_parameters_updated', 'product_parameters_deleted'):
+            self.assertEqual(counts[name], 0, name)
+
+    def test_price_update(self):
+        good = self.data['goods'][0]
+        product_info = self.offer(good['id'])
+        good['price'] = 1000
+        with self.assertNumQueries(20):
+            counts, writes = self.run_import(self.data)
+        self.assertEqual((counts['product_infos_updated'], counts['product_infos_unchanged']),
+                         (1, len(self.data['goods']) - 1))
+        self.assertEqual(counts['product_parameters_updated'] + counts['product_parameters_created'], 0)
+        self.assertEqual(self.offer(good['id']).price, 1000)
+        self.assertEqual(self.offer(good['id']).id, product_info.id)
+        self.assertEqual(BestOffer.objects.get(product=product_info.product).price, 1000)
+        self.assertEqual(CatalogEntry.objects.get(product_info=product_info).price, 1000)
+        self.assertFalse([sql for sql in writes if 'app_productparameter' in sql or 'app_search' in sql])
+
+    def test_stale_offer_removed(self):
+        good = self.data['goods'].pop()
+        product_info = self.offer(good['id'])
+        counts, _ = self.run_import(self.data)
+        self.assertEqual(counts['product_infos_deleted'], 1)
+        self.assertFalse(ProductInfo.objects.filter(id=product_info.id).exists())
+        self.assertFalse(ProductParameter.objects.filter(product_info_id=product_info.id).exists())
+        self.assertFalse(BestOffer.objects.filter(product_id=product_info.product_id).exists())
+        self.assertEqual(ProductInfo.objects.filter(shop=self.shop).count(), len(self.data['goods']))
+
+    def test_category_rename(self):
+        category = self.data['categories'][0]
+        category['name'] = 'Телефоны'
+        counts, _ = self.run_import(self.data)
+        self.assertEqual((counts['categories_updated'], counts['product_infos_updated']), (1, 0))
+        self.assertEqual(Category.objects.get(id=category['id']).name, 'Телефоны')
+        self.assertEqual(set(CatalogEntry.objects.filter(category_id=category['id']).values_list(
+            'category_name', flat=True)), {'Телефоны'})
+
+
+class PriceListParserTest(SimpleTestCase):
+    """
+    Потоковые парсеры прайса дают те же данные, что и загрузка документа целиком
+
+    Пакеты и буфер чтения JSON берутся маленькими, чтобы границы пакетов и
+    порций чтения приходились на середину товаров, чисел и строк.
+    """
+
+    def setUp(self):
+        with open(PRICE_LIST, 'rb') as stream:
+            self.data = yaml.safe_load(stream)
+
+    def collect(self, records, batch_size):
+        """
+        Записи парсера, собранные в документ {shop, categories, goods}
+        """
+        document = {'categories': [], 'goods': []}
+        for section, payload in records:
+            if section == 'shop':
+                document['shop'] = payload
+            else:
+                document[section].extend(payload)
+            if section == 'goods':
+                self.assertLessEqual(len(payload), batch_size)
+        return document
+
+    def parse(self, content, price_list_format, batch_size):
+        return self.collect(iter_price_list(io.BytesIO(content), price_list_format, batch_size), batch_size)
+
+    def parse_json(self, content, batch_size, chunk_size):
+        reader = JsonPriceListReader(io.BytesIO(content), batch_size=batch_size)
+        reader.chunk_size = chunk_size
+        return self.collect(reader, batch_size)
+
+    def test_yaml(self):
+        with open(PRICE_LIST, 'rb') as stream:
+            content = stream.read()
+        for batch_size in (1, 3):
+            self.assertEqual(self.parse(content, 'yaml', batch_size), self.data)
+
+    def test_yaml_aliases(self):
+        content = """
+shop: Магазин
+categories:
+  - {id: 1, name: Категория}
+goods:
+  - &first {id: 1, category: 1, model: M, name: Товар, price: 100, price_rrc: 120, quantity: 3,
+            parameters: &parameters {Цвет: черный, Вес: 1.5}}
+  - <<: *first
+    id: 2
+  - {id: 3, category: 1, model: M, name: Товар 3, price: 200, price_rrc: 220, quantity: 1,
+     parameters: *parameters}
+""".encode()
+        expected = yaml.safe_load(content)
+        for batch_size in (1, 2, 3):
+            self.assertEqual(self.parse(content, 'yaml', batch_size), expected)
+
+    def test_json(self):
+        content = json.dumps({'version': 12345, **self.data}, ensure_ascii=False).encode()
+        expected = json.loads(content)
+        del expected['version']
+        for chunk_size in (1, 2, 7, 64):
+            for batch_size in (1, 3):
+                self.assertEqual(self.parse_json(content, batch_size, chunk_size), expected)
+
+    def test_json_number_at_chunk_end(self):
+        # Числа верхнего уровня разбираются из буфера целиком: при любой длине
+        # порции чтения число на конце буфера не должно обрезаться
+        content = b'{"shop": 12345, "categories": [], "goods": [67890, 1]}'
+        for chunk_size in range(1, len(content) + 1):
+            self.assertEqual(self.parse_json(content, 2, chunk_size), json.loads(content))
+
+    def test_ndjson(self):
+        lines = [{'shop': self.data['shop'], 'categories': self.data['categories']}] + self.data['goods']
+        content = '\n'.join(json.dumps(line, ensure_ascii=False) for line in lines).encode()
+        for batch_size in (1, 3):
+            self.assertEqual(self.parse(content, 'ndjson', batch_size), self.data)
+
+    def test_csv(self):
+        names = {category['id']: category['name'] for category in self.data['categories']}
+        parameters = sorted({name for item in self.data['goods'] for name in item['parameters']})
+        stream = io.StringIO()
+        writer = csv.writer(stream)
+        writer.writerow(['shop', 'category', 'category_name', 'id', 'model', 'name', 'price', 'price_rrc',
+                         'quantity'] + [f'parameters.{name}' for name in parameters])
+        for item in self.data['goods']:
+            writer.writerow([self.data['shop'], item['category'], names[item['category']], item['id'], item['model'],
+                             item['name'], item['price'], item['price_rrc'], item['quantity']]
+                            + [item['parameters'].get(name, '') for name in parameters])
+        content = stream.getvalue().encode()
+
+        used = list(dict.fromkeys(item['category'] for item in self.data['goods']))
+        expected = dict(self.data, categories=[{'id': category_id, 'name': names[category_id]} for category_id in used],
+                        goods=[dict(item, parameters={name: str(value) for name, value in item['parameters'].items()})
+                               for item in self.data['goods']])
+        for batch_size in (1, 3):
+            self.assertEqual(self.parse(content, 'csv', batch_size), expected)
+
+    def test_csv_empty_category_name(self):
+        content = (
+            'shop,category,category_name,id,model,name,price,price_rrc,quantity\n'
+            'S,1,,1,M,Товар 1,100,120,1\n'
+            'S,1,Категория,2,M,Товар 2,100,120,1\n'
+            'S,2,,3,M,Товар 3,100,120,1\n'
+        ).encode()
+        # Название берется из первой непустой ячейки; категория без названия остается с пустым name
+        self.assertEqual(self.parse(content, 'csv', 3)['categories'],
+                         [{'id': 1, 'name': 'Категория'}, {'id': 2, 'name': ''}])
+
+
+class PriceListValidationTest(TestCase):
+    """
+    Отчет проверки прайса и проверка без записи (dry_run)
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('shop@example.com', 'password', username='shop', type='shop',
+                                             is_active=True)
+
+    @staticmethod
+    def good(external_id, **fields):
+        return {'id': external_id, 'category': 1, 'model': 'M', 'name': f'Товар {external_id}', 'price': 100,
+                'price_rrc': 120, 'quantity': 3, 'parameters': {'Цвет': 'черный'}, **fields}
+
+    def validate(self, goods):
+        return validate_price_list(iter_price_list_document(
+            {'shop': 'Магазин', 'categories': [{'id': 1, 'name': 'Категория'}], 'goods': goods},
+            batch_size=2,
+        )).as_dict()
+
+    def test_valid(self):
+        self.assertEqual(self.validate([self.good(1), self.good(2), self.good(3)]),
+                         {'valid': True, 'shop': 'Магазин', 'categories': 1, 'goods': 3, 'errors': []})
+
+    def test_long_parameter_value(self):
+        max_length = ProductParameter._meta.get_field('value').max_length
+        report = self.validate([self.good(1), self.good(2), self.good(3, parameters={'Цвет': 'x' * (max_length + 1)})])
+        self.assertFalse(report['valid'])
+        self.assertEqual(report['errors'], [{'code': 'long_parameter_value',
+                                             'message': f'Значение параметра длиннее {max_length} символов',
+                                             'count': 1, 'rows': [2]}])
+
+    def test_out_of_range(self):
+        report = self.validate([self.good(1, price=-1), self.good(2),
+                                self.good(3, quantity=MAX_POSITIVE_INTEGER + 1), self.good(4, quantity='5')])
+        self.assertEqual({error['code']: (error['count'], error['rows']) for error in report['errors']},
+                         {'invalid_price': (1, [0]), 'invalid_quantity': (2, [2, 3])})
+        self.assertEqual(report['goods'], 4)
+
+    def test_unknown_category(self):
+        report = self.validate([self.good(1, category=7), self.good(2), self.good(3, category=7)])
+        self.assertEqual(report['errors'], [{'code': 'unknown_category',
+                                             'message': 'Категория товара отсутствует в разделе categories',
+                                             'count': 2, 'rows': [0, 2]}])
+
+    def test_parse_error(self):
+        # Второй товар обрывается посреди объекта
+        content = (
+            'shop: Магазин\n'
+            'categories: [{id: 1, name: Категория}]\n'
+            'goods:\n'
+            '  - {id: 1, category: 1, model: M, name: Товар, price: 1, price_rrc: 1, quantity: 1, parameters: {}}\n'
+            '  - {id: 2\n'
+        ).encode()
+        report = validate_price_list(iter_price_list(io.BytesIO(content), 'yaml', batch_size=1)).as_dict()
+        self.assertFalse(report['valid'])
+        self.assertEqual((report['shop'], report['goods']), ('Магазин', 1))
+        self.assertEqual([(error['code'], error['count'], error['rows']) for error in report['errors']],
+                         [('parse_error', 1, [1])])
+        self.assertTrue(report['errors'][0]['message'].startswith('Ошибка разбора прайса: '))
+
+    def run_dry(self, goods):
+        content = yaml.safe_dump({'shop': 'Магазин', 'categories': [{'id': 1, 'name': 'Категория'}],
+                                  'goods': goods}, allow_unicode=True).encode()
+        job = ImportJob.objects.create(user=self.user, url='http://example.com/shop.yaml', dry_run=True,
+                                       state='running')
+        result = FetchResult(False, body=io.BytesIO(content), content_type='application/x-yaml', size=len(content))
+        with mock.patch('app.jobs.fetch_price_list', return_value=result):
+            job = run_import_job(job)
+        return job, json.loads(job.stats)
+
+    def test_dry_run(self):
+        job, report = self.run_dry([self.good(1), self.good(2)])
+        self.assertEqual((job.state, job.error, job.rows_processed), ('done', '', 2))
+        self.assertEqual(report, {'valid': True, 'shop': 'Магазин', 'categories': 1, 'goods': 2, 'errors': []})
+        self.assertFalse(Shop.objects.exists())
+        self.assertFalse(ProductInfo.objects.exists())
+
+    def test_dry_run_errors(self):
+        job, report = self.run_dry([self.good(1, price=-5), self.good(2, category=9)])
+        self.assertEqual((job.state, job.error), ('failed', 'Прайс содержит ошибки'))
+        self.assertEqual([(error['code'], error['rows']) for error in report['errors']],
+                         [('invalid_price', [0]), ('unknown_category', [1])])
+        self.assertFalse(Shop.objects.exists())
+
+
+class ShopImportLeaseTest(TestCase):
+    """
+    Импорты одного магазина без общей транзакции не чередуются
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('shop@example.com', 'password', username='shop', type='shop',
+                                             is_active=True)
+
+    @staticmethod
+    def records():
+        return [('shop', 'Магазин'), ('categories', [{'id': 1, 'name': 'Категория'}]),
+                ('goods', [{'id': 1, 'category': 1, 'model': 'M', 'name': 'Товар', 'price': 100, 'price_rrc': 120,
+                            'quantity': 3, 'parameters': {}}])]
+
+    def test_lease_released(self):
+        import_price_list(self.records(), self.user.id, atomic=False)
+        self.assertIsNone(Shop.objects.get(user=self.user).import_started_at)
+
+    def test_busy_shop(self):
+        Shop.objects.create(name='Магазин', user=self.user, import_started_at=timezone.now())
+        with self.assertRaises(ShopImportBusy), transaction.atomic():
+            import_price_list(self.records(), self.user.id, atomic=False)
+        self.assertFalse(ProductInfo.objects.exists())
+
+    def test_abandoned_lease(self):
+        Shop.objects.create(name='Магазин', user=self.user,
+                            import_started_at=timezone.now() - timedelta(seconds=settings.IMPORT_SHOP_LEASE + 1))
+        import_price_list(self.records(), self.user.id, atomic=False)
+        self.assertEqual(ProductInfo.objects.count(), 1)
+
+    def test_no_ownerless_shops(self):
+        with self.assertRaises(ValueError), transaction.atomic():
+            import_price_list(self.records(), None, atomic=False)
+        self.assertFalse(Shop.objects.exists())
+
+    def test_jobs_of_busy_user_wait(self):
+        ImportJob.objects.create(user=self.user, url='http://example.com/1.yaml', state='running')
+        ImportJob.objects.create(user=self.user, url='http://example.com/2.yaml')
+        self.assertIsNone(claim_next_job())
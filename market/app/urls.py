@@ -3,7 +3,9 @@ from django.urls import path, include
 from django.conf.urls import url
 from app.views import PartnerUpdate, GetShopsView, GetProductsView, \
     FindProductsView, UserView, ContactView, ApiRoot, UserRegister, UserConfirm, BasketView, \
-    UserLoginView, CategoriesView, OrdersView, PartnerView
+    UserLoginView, CategoriesView, OrdersView, PartnerView, PartnerUpdateStatus, \
+    PartnerUpdateMetrics, CompareProductsView, CatalogView, AutocompleteView, \
+    BasketSummaryView
 
 from django_rest_passwordreset.views import reset_password_request_token, reset_password_confirm
 
@@ -55,11 +57,15 @@ urlpatterns = [
     path('user/password_reset/confirm', reset_password_confirm, name='password-reset-confirm'),
 
     path('basket', BasketView.as_view(), name='basket'),
+    path('basket/summary', BasketSummaryView.as_view(), name='basket-summary'),
 
     path('shops/get', GetShopsView.as_view(), name='get-shops'),
     path('products/get/<int:pk>', GetProductsView.as_view(), name='get-products'),
     # path('category/get/<int:category>', GetCategoryView.as_view(), name='get-category'),
     path('products/find', FindProductsView.as_view(), name='find-products'),
+    path('products/autocomplete', AutocompleteView.as_view(), name='autocomplete'),
+    path('products/compare', CompareProductsView.as_view(), name='compare-products'),
+    path('catalog', CatalogView.as_view(), name='catalog'),
     path('category', CategoriesView.as_view(), name='get-categories'),
     path('orders', OrdersView.as_view(), name='orders'),
     path('partners', PartnerView.as_view(), name='partners'),
@@ -67,5 +73,7 @@ urlpatterns = [
     # url(r'^products/get/(?P<pk>[0-9]+)/$', GetProductsView.as_view(), name='get-products'),
 
     path('products/load/', PartnerUpdate.as_view(), name='load-products'),
+    path('products/load/<int:pk>', PartnerUpdateStatus.as_view(), name='load-products-status'),
+    path('products/load/metrics', PartnerUpdateMetrics.as_view(), name='load-products-metrics'),
 
 ]
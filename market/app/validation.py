@@ -0,0 +1,179 @@
+from app.models import Shop, Category, Product, ProductInfo, Parameter, ProductParameter
+
+# Максимальное значение PositiveIntegerField
+MAX_POSITIVE_INTEGER = 2147483647
+# Количество примеров строк для каждого вида ошибок
+MAX_EXAMPLES = 10
+
+GOODS_FIELDS = ('id', 'category', 'model', 'name', 'price', 'price_rrc', 'quantity', 'parameters')
+INTEGER_FIELDS = ('id', 'category', 'price', 'price_rrc', 'quantity')
+STRING_FIELDS = {
+    'name': Product._meta.get_field('name').max_length,
+    'model': ProductInfo._meta.get_field('model').max_length,
+}
+
+
+class ValidationReport:
+    """
+    Сводка ошибок прайса: по каждому виду ошибки - количество и примеры строк
+
+    Строки - порядковые номера (с нуля) в разделе goods или categories.
+    """
+
+    def __init__(self):
+        self.errors = {}
+        self.shop = None
+        self.categories = 0
+        self.goods = 0
+
+    def add(self, code, message, rows, count=None):
+        if not rows:
+            return
+        error = self.errors.setdefault(code, {'code': code, 'message': message, 'count': 0, 'rows': []})
+        error['count'] += len(rows) if count is None else count
+        error['rows'].extend(rows[:MAX_EXAMPLES - len(error['rows'])])
+
+    @property
+    def valid(self):
+        return not self.errors
+
+    def as_dict(self):
+        return {
+            'valid': self.valid,
+            'shop': self.shop,
+            'categories': self.categories,
+            'goods': self.goods,
+            'errors': list(self.errors.values()),
+        }
+
+
+def is_integer(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class PriceListValidator:
+    """
+    Проверка прайса за один проход без записи в БД
+
+    Принимает те же записи, что и PriceListImporter. Проверки выполняются
+    по колонкам для всего пакета товаров: обязательные поля, целые числа в
+    допустимом диапазоне, длины строк, ссылки на категории, повторы
+    внешних ИД и длины значений параметров.
+    """
+
+    def __init__(self):
+        self.report = ValidationReport()
+        self.category_ids = set()
+        self.external_ids = set()
+        self.category_refs = {}
+        self.shop_name_length = Shop._meta.get_field('name').max_length
+        self.category_name_length = Category._meta.get_field('name').max_length
+        self.parameter_name_length = Parameter._meta.get_field('name').max_length
+        self.parameter_value_length = ProductParameter._meta.get_field('value').max_length
+
+    def run(self, records):
+        try:
+            for section, payload in records:
+                if section == 'shop':
+                    self.check_shop(payload)
+                elif section == 'categories':
+                    self.check_categories(payload)
+                elif section == 'goods':
+                    self.check_goods(payload)
+        except Exception as e:
+            self.report.add('parse_error', f'Ошибка разбора прайса: {e}', [self.report.goods])
+
+        if self.report.shop is None:
+            self.report.add('missing_shop', 'Не указан магазин', [0])
+        unknown = [refs for category_id, refs in self.category_refs.items() if category_id not in self.category_ids]
+        self.report.add('unknown_category', 'Категория товара отсутствует в разделе categories',
+                        sorted(row for _, rows in unknown for row in rows)[:MAX_EXAMPLES],
+                        count=sum(count for count, _ in unknown))
+        return self.report
+
+    def check_shop(self, name):
+        self.report.shop = name
+        if not isinstance(name, str) or not name or len(name) > self.shop_name_length:
+            self.report.add('invalid_shop', f'Название магазина - строка до {self.shop_name_length} символов', [0])
+
+    def check_categories(self, categories):
+        if not isinstance(categories, list):
+            self.report.add('invalid_categories', 'Раздел categories должен быть списком', [0])
+            return
+        offset = self.report.categories
+        self.report.categories += len(categories)
+        self.report.add('invalid_category', 'Категория должна содержать целый id и непустое name',
+                        [offset + row for row, category in enumerate(categories)
+                         if not isinstance(category, dict)
+                         or not is_integer(category.get('id'))
+                         or not isinstance(category.get('name'), str)
+                         or not category['name'].strip()])
+        self.report.add('long_category_name', f'Название категории длиннее {self.category_name_length} символов',
+                        [offset + row for row, category in enumerate(categories)
+                         if isinstance(category, dict) and isinstance(category.get('name'), str)
+                         and len(category['name']) > self.category_name_length])
+        self.category_ids.update(category['id'] for category in categories
+                                 if isinstance(category, dict) and is_integer(category.get('id')))
+
+    def check_goods(self, goods):
+        offset = self.report.goods
+        self.report.goods += len(goods)
+        rows = range(len(goods))
+
+        invalid = [row for row in rows if not isinstance(goods[row], dict)]
+        self.report.add('invalid_good', 'Товар должен быть объектом', [offset + row for row in invalid])
+        goods = [item if isinstance(item, dict) else {} for item in goods]
+
+        for field in GOODS_FIELDS:
+            self.report.add(f'missing_{field}', f'Не указано поле {field}',
+                            [offset + row for row in rows if field not in goods[row]])
+
+        for field in INTEGER_FIELDS:
+            values = [goods[row].get(field) for row in rows]
+            self.report.add(f'invalid_{field}', f'Поле {field} - целое число от 0 до {MAX_POSITIVE_INTEGER}',
+                            [offset + row for row in rows
+                             if field in goods[row]
+                             and not (is_integer(values[row]) and 0 <= values[row] <= MAX_POSITIVE_INTEGER)])
+
+        for field, max_length in STRING_FIELDS.items():
+            self.report.add(f'invalid_{field}', f'Поле {field} - строка до {max_length} символов',
+                            [offset + row for row in rows
+                             if field in goods[row]
+                             and not (isinstance(goods[row][field], str) and len(goods[row][field]) <= max_length)])
+
+        for row in rows:
+            category_id = goods[row].get('category')
+            if is_integer(category_id):
+                refs = self.category_refs.setdefault(category_id, [0, []])
+                refs[0] += 1
+                if len(refs[1]) < MAX_EXAMPLES:
+                    refs[1].append(offset + row)
+
+        duplicates = []
+        for row in rows:
+            external_id = goods[row].get('id')
+            if not is_integer(external_id):
+                continue
+            if external_id in self.external_ids:
+                duplicates.append(offset + row)
+            self.external_ids.add(external_id)
+        self.report.add('duplicate_id', 'Повторяющийся внешний id товара', duplicates)
+
+        parameters = [goods[row].get('parameters') for row in rows]
+        self.report.add('invalid_parameters', 'Поле parameters должно быть объектом',
+                        [offset + row for row in rows
+                         if 'parameters' in goods[row] and not isinstance(parameters[row], dict)])
+        parameters = [value if isinstance(value, dict) else {} for value in parameters]
+        self.report.add('long_parameter_name', f'Имя параметра длиннее {self.parameter_name_length} символов',
+                        [offset + row for row in rows
+                         if any(len(str(name)) > self.parameter_name_length for name in parameters[row])])
+        self.report.add('long_parameter_value', f'Значение параметра длиннее {self.parameter_value_length} символов',
+                        [offset + row for row in rows
+                         if any(len(str(value)) > self.parameter_value_length for value in parameters[row].values())])
+
+
+def validate_price_list(records):
+    """
+    Проверка прайса из записей, полученных от парсера
+    """
+    return PriceListValidator().run(records)
@@ -1,28 +1,128 @@
 import json
-from requests import get
-from yaml import load as load_yaml, Loader
 from drf_yasg.utils import swagger_auto_schema
 
 from django.core.mail import EmailMultiAlternatives
 from django.conf import settings
-from django.views.decorators.csrf import csrf_exempt
 from django.core.validators import URLValidator
 from django.http import JsonResponse
 from django.db import transaction
+from django.db.models import Avg, Count, Exists, F, Max, OuterRef, Q, Sum
 from django.contrib.auth import authenticate
 
 from rest_framework import permissions
 from rest_framework.authtoken.models import Token
 from rest_framework.exceptions import ValidationError
 from rest_framework.views import APIView
-from rest_framework.generics import ListAPIView, RetrieveAPIView
+from rest_framework.generics import ListAPIView, RetrieveAPIView, get_object_or_404
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
 
-from app.models import Shop, Category, Product, ProductInfo, Parameter, ProductParameter, User, \
-    Contact, ConfirmEmailToken, Order, OrderItem
+from app.models import Shop, Category, Product, ProductInfo, User, \
+    Contact, ConfirmEmailToken, Order, ImportJob, BestOffer, CatalogEntry, \
+    PRICE_LIST_FORMAT_CHOICES
+from app.fast_serializers import ProductValuesSerializer, ProductPriceValuesSerializer, OrderValuesSerializer, \
+    BasketItemValuesSerializer
+from app.autocomplete import autocomplete
+from app.basket import add_items, update_items, delete_items, basket_lines, line_sum, count_summary, \
+    get_summary, invalidate_summary, place_order
+from app.idempotency import idempotent
+from app.facets import parse_parameter_filters, filter_offers, get_facets
+from app.pagination import SearchPageNumberPagination, ProductCursorPagination, ProductPriceCursorPagination, \
+    BestOfferCursorPagination, CatalogCursorPagination, OrderCursorPagination
+from app.offers import min_price
+from app.search import search_products
 from app.serializers import ShopSerializer, ProductSerializer, UserSerializer, ContactSerializer, \
-    OrderItemSerializer, CategorySerializer, OrderSerializer
+    CategorySerializer, OrderSerializer, ImportJobSerializer, BestOfferSerializer, \
+    CatalogEntrySerializer
+
+
+class EagerLoadingMixin:
+    """
+    Подготовка queryset под сериализатор представления
+
+    Если у сериализатора есть setup_eager_loading, он добавляет к queryset
+    нужные select_related/prefetch_related, и число запросов не зависит от
+    количества объектов в ответе.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        serializer_class = self.get_serializer_class()
+        if hasattr(serializer_class, 'setup_eager_loading'):
+            queryset = serializer_class.setup_eager_loading(queryset)
+        return queryset
+
+
+class ValuesListMixin:
+    """
+    Вывод списка через быстрый сериализатор из app.fast_serializers
+
+    Строки выбираются через values() и превращаются в словари без создания
+    экземпляров моделей и полей DRF; JSON совпадает с serializer_class.
+    Параметры запроса fields и expand (через запятую) ограничивают вывод
+    выбранными полями: запрос выбирает только их столбцы, а соединения и
+    вложенные списки строятся только для запрошенных вложенных объектов.
+    """
+    values_serializer_class = None
+    values_serializer = None
+
+    def get_values_serializer_class(self):
+        return self.values_serializer_class
+
+    def parse_fields(self, request):
+        """
+        Сериализатор под поля из строки запроса, при ошибке - ValueError
+        """
+        self.values_serializer = self.get_values_serializer_class().for_query(request.GET)
+
+    def is_selected(self, name):
+        """
+        Выбрано ли поле ответа; до разбора полей (например, при построении
+        схемы drf_yasg) сериализатора еще нет, и поле считается невыбранным
+        """
+        return self.values_serializer is not None and name in self.values_serializer.selected
+
+    def get_ordering_columns(self):
+        """
+        Поля сортировки пагинации, которые нужны в строках для ссылок на страницы
+        """
+        ordering = getattr(self.paginator, 'ordering', None) or ()
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        return [field.lstrip('-') for field in ordering]
+
+    def list(self, request, *args, **kwargs):
+        try:
+            if self.values_serializer is None:
+                self.parse_fields(request)
+        except ValueError as e:
+            return JsonResponse({'Status': False, 'Error': str(e)}, status=400)
+
+        serializer = self.values_serializer
+        rows = serializer.values(self.filter_queryset(self.get_queryset()), *self.get_ordering_columns())
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return Response(serializer.to_representation(rows))
+        return self.get_paginated_response(serializer.to_representation(page))
+
+
+class ValuesRetrieveMixin(ValuesListMixin):
+    """
+    Вывод одного объекта через быстрый сериализатор с выбором полей
+    """
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            self.parse_fields(request)
+        except ValueError as e:
+            return JsonResponse({'Status': False, 'Error': str(e)}, status=400)
+
+        serializer = self.values_serializer
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_object_or_404(serializer.values(self.filter_queryset(self.get_queryset())),
+                                **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        self.check_object_permissions(request, row)
+        return Response(serializer.to_representation([row])[0])
 
 
 ##########
@@ -277,22 +377,21 @@ class BasketView(APIView):
         """
         Добавить товары в корзину
 
-        Добавить товары в корзину
+        Добавить товары в корзину. Все позиции проверяются до записи: при
+        ошибке в любой из них корзина не меняется, а в Errors возвращаются
+        ошибки по номерам позиций. Количество товара, который уже есть
+        в корзине, увеличивается.
         """
+        basket_items = request.data.get('items')
         try:
-            basket_items = json.loads(request.data.get('items'))
+            if isinstance(basket_items, str):
+                basket_items = json.loads(basket_items)
         except ValueError:
             return JsonResponse({'Status': False, 'Errors': 'Запрос составлен некорректно'})
 
-        basket, _ = Order.objects.get_or_create(user_id=request.user.id, state='basket')
-
-        for item in basket_items:
-            item.update({'order': basket.id})
-            basket_serializer = OrderItemSerializer(data=item)
-            if basket_serializer.is_valid():
-                basket_serializer.save()
-            else:
-                return JsonResponse({'Status': False, 'Errors': basket_serializer.errors})
+        errors = add_items(request.user.id, basket_items)
+        if errors:
+            return JsonResponse({'Status': False, 'Errors': errors})
 
         return JsonResponse({'Status': True})
 
@@ -300,107 +399,329 @@ class BasketView(APIView):
         """
         Редактировать содержимое корзины
 
-        Редактировать содержимое корзины
+        Редактировать содержимое корзины: items - список {product_info,
+        quantity} с новым количеством. В ответе - id измененных предложений
+        и отклоненные позиции с причиной.
         """
+        basket_items = request.data.get('items')
         try:
-            basket_items = json.loads(request.data.get('items'))
+            if isinstance(basket_items, str):
+                basket_items = json.loads(basket_items)
         except ValueError:
             return JsonResponse({'Status': False, 'Errors': 'Запрос составлен некорректно'})
+        if not isinstance(basket_items, list):
+            return JsonResponse({'Status': False, 'Errors': 'Запрос составлен некорректно'})
 
-        updated_items = []
-        unupdated_items = []
-
-        for item in basket_items:
-            if isinstance(item['product_info'], int) and isinstance(item['quantity'], int):
-                try:
-                    product = ProductInfo.objects.get(product__id=item['product_info'])
-
-                    OrderItem.objects.filter(order__user=request.user,
-                                          order__state='basket',
-                                          product_info=product
-                                          ).update(quantity=item['quantity'])
-
-                except:
-                    unupdated_items.append(item)
-                else:
-                    updated_items.append(item['product_info'])
-            else:
-                unupdated_items.append(item)
+        updated_items, unupdated_items = update_items(request.user.id, basket_items)
 
-        return JsonResponse(
-            {'Updated items': str(updated_items), 'Unupdated items': str(unupdated_items)})
+        return JsonResponse({'Status': not unupdated_items,
+                             'Updated items': updated_items, 'Unupdated items': unupdated_items})
 
     def delete(self, request, *args, **kwags):
         """
         Удалить товары из корзины
 
-        Удалить товары из корзины
+        Удалить товары из корзины: items - id позиций корзины через запятую.
+        В ответе - удаленные id и ошибки по остальным.
         """
         try:
-            delete_items = [int(x) for x in request.data.get('items').split(',')]
+            item_ids = [int(x) for x in str(request.data.get('items')).split(',') if x.strip()]
         except ValueError:
             return JsonResponse({'Status': False, 'Errors': 'Запрос составлен некорректно'})
-        deleted_items = []
-        undeleted_items = {}
-        for item in delete_items:
-            try:
-                OrderItem.objects.get(order__user=request.user,
-                                      order__state='basket',
-                                      pk=item).delete()
-            except Exception as e:
-                undeleted_items[item] = e.args[0]
-            else:
-                deleted_items.append(item)
 
-        return JsonResponse({'Deleted items': str(deleted_items), 'Undeleted items': str(undeleted_items)})
+        deleted_items, undeleted_items = delete_items(request.user.id, item_ids)
+
+        return JsonResponse({'Status': not undeleted_items,
+                             'Deleted items': deleted_items, 'Undeleted items': undeleted_items})
 
     def get(self, request, *args, **kwags):
         """
         Получить содержимое корзины
 
-        Получить содержимое корзины
+        Получить содержимое корзины: позиции с названием товара, магазином,
+        ценой и стоимостью (sum), а также число позиций (lines), количество
+        товаров (total_quantity) и общая сумма (total_sum), посчитанные в БД.
         """
-        items = OrderItem.objects.filter(order__user=request.user, order__state='basket')
-        items_serializer = OrderItemSerializer(items, many=True)
+        serializer = BasketItemValuesSerializer()
+        items = basket_lines(request.user.id).annotate(sum=line_sum()).order_by('pk')
 
-        return Response(items_serializer.data)
+        return Response({'items': serializer.to_representation(serializer.values(items)),
+                         **count_summary(request.user.id)})
 
 
-class GetProductsView(RetrieveAPIView):
+class BasketSummaryView(APIView):
     """
-    Просмотр детальной информации о продукте
+    Сводка корзины
+
+    Число позиций (lines), количество товаров (total_quantity) и сумма (total_sum)
+    корзины для счетчика в шапке. Сводка хранится в кэше и сбрасывается при
+    изменении корзины или цен, поэтому обычно не требует запросов к БД.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get(self, request, *args, **kwargs):
+        return Response(get_summary(request.user.id))
+
 
+class GetProductsView(ValuesRetrieveMixin, RetrieveAPIView):
+    """
     Просмотр детальной информации о продукте
+
+    Просмотр детальной информации о продукте. Поля ответа можно выбрать
+    параметром fields (id, name, category, product_infos, min_price),
+    вложенные предложения добавить к ним параметром expand=product_infos.
     """
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    values_serializer_class = ProductValuesSerializer
     permission_classes = (permissions.IsAuthenticated,)
 
+    def get_queryset(self):
+        products = super().get_queryset()
+        if self.is_selected('min_price'):
+            products = products.annotate(min_price=min_price(ProductInfo.objects.all()))
+        return products
+
 
-class FindProductsView(ListAPIView):
+class FindProductsView(ValuesListMixin, ListAPIView):
     """
     Поиск товара по параметрам
 
     Поиск товара по параметрам:
      * Категория
      * Магазин
+     * Значения параметров: param_<id>=значение (несколько через запятую)
+     * Диапазон числовых параметров: param_<id>_min, param_<id>_max
+     * Текст: q=строка (название, модель и значения параметров, по префиксам слов)
+     * Цена предложения: min_price, max_price
+
+    Результат выводится постранично по ключу (параметры cursor и page_size),
+    вместе с количеством товаров по значениям параметров (facets). Без
+    фильтров по тексту, цене и параметрам фасеты берутся из индекса по
+    категории и магазину, с ними - считаются по отобранным предложениям,
+    если их не больше FACET_LIVE_LIMIT. Для более широкой выборки фасеты
+    тоже берутся из индекса, и facets_filtered в ответе равно false.
+    При поиске по тексту товары упорядочены по релевантности и выводятся
+    постранично по номеру страницы (параметры page, page_size и count).
+    При ordering=price (или -price) товары упорядочены по цене лучшего
+    предложения в наличии (BestOffer), она выводится в поле min_price;
+    товары без предложений в наличии в такую выдачу не попадают.
+    Выбор полей ответа - параметры fields и expand, как у просмотра товара.
     """
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    values_serializer_class = ProductValuesSerializer
     permission_classes = (permissions.IsAuthenticated,)
+    pagination_class = ProductCursorPagination
     lookup_field = 'category'
+    parameter_filters = {}
+    search_query = ''
+    price_range = {}
+    price_ordering = ''
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if self.search_query:
+                self._paginator = SearchPageNumberPagination()
+            elif self.price_ordering:
+                self._paginator = ProductPriceCursorPagination()
+        return super().paginator
+
+    def parse_filters(self, request):
+        """
+        Разбор фильтров и выбранных полей из строки запроса, при ошибке - ValueError
+        """
+        self.parameter_filters = parse_parameter_filters(request.GET)
+        self.search_query = request.GET.get('q', '').strip()
+
+        self.price_range = {}
+        for param, lookup in (('min_price', 'price__gte'), ('max_price', 'price__lte')):
+            if value := request.GET.get(param):
+                if not value.isdigit():
+                    raise ValueError(f'Параметр {param} должен быть целым числом')
+                self.price_range[lookup] = int(value)
+
+        self.price_ordering = request.GET.get('ordering', '')
+        if self.price_ordering not in ('', 'price', '-price'):
+            raise ValueError('Допустимая сортировка: price, -price')
+
+        self.parse_fields(request)
 
     def get_queryset(self):
-        products = Product.objects.all()
+        products = super().get_queryset()
 
         if category := self.request.GET.get('category_id'):
             products = products.filter(category=category)
 
-        if shop := self.request.GET.get('shop_id'):
-            products = products.filter(product_infos__shop__pk=shop)
+        if self.search_query:
+            products = search_products(products, self.search_query)
 
+        offers = self.get_offers()
+        if self.price_ordering:
+            return self.order_by_price(products, offers, category)
+
+        if offers is not None:
+            products = products.filter(id__in=offers.values('product_id'))
+        if self.is_selected('min_price'):
+            products = products.annotate(min_price=min_price(ProductInfo.objects.all() if offers is None else offers))
         return products
 
+    def order_by_price(self, products, offers, category):
+        """
+        Товары по хранимой цене лучшего предложения (BestOffer)
+
+        Индекс (price, product) или (category, price, product) читается по
+        порядку, а отбор по предложениям проверяется для каждой строки через
+        EXISTS, поэтому страница не требует сортировки всей выборки. Товары
+        без предложений в наличии в выдачу по цене не попадают.
+        """
+        products = products.filter(best_offer__isnull=False).annotate(
+            min_price=F('best_offer__price'), best_offer_pk=F('best_offer__pk'),
+        )
+        if category:
+            products = products.filter(best_offer__category_id=category)
+        if offers is not None:
+            products = products.annotate(
+                has_offers=Exists(offers.filter(product_id=OuterRef('pk'))),
+            ).filter(has_offers=True)
+        if self.price_ordering == 'price':
+            return products.order_by('min_price', 'best_offer_pk')
+        return products.order_by('-min_price', '-best_offer_pk')
+
+    def get_offers(self):
+        """
+        Предложения, отобранные по магазину и параметрам, или None без этих фильтров
+        """
+        filters = self.parameter_filters
+        shop = self.request.GET.get('shop_id')
+        if not shop and not filters and not self.search_query and not self.price_range:
+            return None
+        offers = ProductInfo.objects.filter(**self.price_range)
+        if shop:
+            offers = offers.filter(shop_id=shop)
+        if category := self.request.GET.get('category_id'):
+            offers = offers.filter(product__category_id=category)
+        if self.search_query:
+            found = search_products(Product.objects.all(), self.search_query, ordered=False)
+            offers = offers.filter(product_id__in=found.values('id'))
+        return filter_offers(offers, filters)
+
+    def get_values_serializer_class(self):
+        if self.price_ordering:
+            return ProductPriceValuesSerializer
+        return super().get_values_serializer_class()
+
+    def list(self, request, *args, **kwargs):
+        try:
+            self.parse_filters(request)
+        except ValueError as e:
+            return JsonResponse({'Status': False, 'Error': str(e)}, status=400)
+
+        response = super().list(request, *args, **kwargs)
+        offers = self.get_offers() if self.parameter_filters or self.search_query or self.price_range else None
+        facets, filtered = get_facets(category_id=request.GET.get('category_id'),
+                                      shop_id=request.GET.get('shop_id'), offers=offers)
+        response.data['facets'] = facets
+        response.data['facets_filtered'] = filtered
+        return response
+
+
+class AutocompleteView(APIView):
+    """
+    Подсказки при вводе
+
+    Подсказки по названиям категорий и товаров и моделям предложений:
+    q - введенный текст (последнее слово - начало слова), limit - количество
+    подсказок (по умолчанию 10, не больше 50). Подсказки ищутся в индексе
+    в памяти процесса, который перестраивается после импорта прайсов.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+    default_limit = 10
+    max_limit = 50
+
+    def get(self, request, *args, **kwargs):
+        limit = request.GET.get('limit', str(self.default_limit))
+        if not limit.isdigit():
+            return JsonResponse({'Status': False, 'Error': 'Параметр limit должен быть целым числом'}, status=400)
+
+        return Response({'results': autocomplete(request.GET.get('q', ''), min(max(int(limit), 1), self.max_limit))})
+
+
+class CatalogView(ListAPIView):
+    """
+    Каталог предложений
+
+    Строка на предложение: товар, категория, магазин, цены, остаток и
+    параметры. Данные берутся из плоской проекции каталога без соединений
+    таблиц. Фильтры: category_id, shop_id, product_id.
+    """
+    queryset = CatalogEntry.objects.all()
+    serializer_class = CatalogEntrySerializer
+    permission_classes = (permissions.IsAuthenticated,)
+    pagination_class = CatalogCursorPagination
+
+    def get_queryset(self):
+        entries = super().get_queryset()
+
+        for param, field in (('category_id', 'category_id'), ('shop_id', 'shop_id'), ('product_id', 'product_id')):
+            if value := self.request.GET.get(param):
+                entries = entries.filter(**{field: value})
+
+        return entries
+
+    def list(self, request, *args, **kwargs):
+        for param in ('category_id', 'shop_id', 'product_id'):
+            if not request.GET.get(param, '0').isdigit():
+                return JsonResponse({'Status': False, 'Error': f'Параметр {param} должен быть целым числом'},
+                                    status=400)
+        return super().list(request, *args, **kwargs)
+
+
+class CompareProductsView(EagerLoadingMixin, ListAPIView):
+    """
+    Сравнение цен
+
+    Для каждого товара - минимальная цена в наличии, магазин с этой ценой
+    и количество предложений в наличии, от дешевых к дорогим. Фильтры:
+     * Категория: category_id
+     * Товары: product_id (несколько через запятую)
+     * Цена: min_price, max_price
+
+    Данные берутся из таблицы лучших предложений, которую обновляет импорт.
+    """
+    queryset = BestOffer.objects.all()
+    serializer_class = BestOfferSerializer
+    permission_classes = (permissions.IsAuthenticated,)
+    pagination_class = BestOfferCursorPagination
+
+    def get_queryset(self):
+        best_offers = super().get_queryset()
+
+        if category := self.request.GET.get('category_id'):
+            best_offers = best_offers.filter(category_id=category)
+
+        if products := self.request.GET.get('product_id'):
+            best_offers = best_offers.filter(product_id__in=[product for product in products.split(',') if product])
+
+        if min_price := self.request.GET.get('min_price'):
+            best_offers = best_offers.filter(price__gte=min_price)
+
+        if max_price := self.request.GET.get('max_price'):
+            best_offers = best_offers.filter(price__lte=max_price)
+
+        return best_offers
+
+    def list(self, request, *args, **kwargs):
+        for param in ('category_id', 'min_price', 'max_price'):
+            if not request.GET.get(param, '0').isdigit():
+                return JsonResponse({'Status': False, 'Error': f'Параметр {param} должен быть целым числом'},
+                                    status=400)
+        if not all(product.isdigit() for product in request.GET.get('product_id', '').split(',') if product):
+            return JsonResponse({'Status': False, 'Error': 'Параметр product_id - целые числа через запятую'},
+                                status=400)
+        return super().list(request, *args, **kwargs)
+
 
 class OrdersView(APIView):
     permission_classes = (permissions.IsAuthenticated,)
@@ -409,19 +730,31 @@ class OrdersView(APIView):
         """
         Просмотр заказов
 
-        Просмотр заказов
+        Просмотр заказов. Поля ответа можно выбрать параметром fields
+        (id, ordered_items, state, dt, contact), вложенные объекты добавить
+        к ним параметром expand (ordered_items, contact).
         """
-        order = Order.objects.filter(
-            user_id=request.user.id).exclude(state='basket').distinct()
+        order = Order.objects.filter(user_id=request.user.id).exclude(state='basket').distinct()
 
-        serializer = OrderSerializer(order, many=True)
-        return Response(serializer.data)
+        try:
+            serializer = OrderValuesSerializer.for_query(request.GET)
+        except ValueError as e:
+            return JsonResponse({'Status': False, 'Error': str(e)}, status=400)
+
+        paginator = OrderCursorPagination()
+        page = paginator.paginate_queryset(serializer.values(order, 'dt'), request, view=self)
+        return paginator.get_paginated_response(serializer.to_representation(page))
 
+    @idempotent
     def post(self, request, *args, **kwags):
         """
         Размещение заказа
 
-        Размещение заказа
+        Размещение заказа. Остатки всех позиций резервируются в одной
+        транзакции; если какого-то товара не хватает, заказ не размещается,
+        а в Errors возвращаются недостающие предложения. С заголовком
+        Idempotency-Key повторный запрос с тем же ключом получает ответ
+        первого, не размещая заказ снова.
         """
 
         try:
@@ -436,15 +769,15 @@ class OrdersView(APIView):
             return JsonResponse(
                 {'Status': False, 'Errors': 'Корзина пуста'})
 
-        with transaction.atomic():
-            order.state = 'new'
-            order.contact = contact
-            order.save()
+        errors = place_order(order.id, contact.id)
+        if errors:
+            return JsonResponse({'Status': False, 'Errors': errors})
 
+        invalidate_summary(request.user.id)
         return JsonResponse({'Status': True, 'Errors': 'Заказ размещен'})
 
 
-class CategoriesView(ListAPIView):
+class CategoriesView(EagerLoadingMixin, ListAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = (permissions.IsAuthenticated,)
@@ -458,7 +791,11 @@ class PartnerUpdate(APIView):
     """
     Обновление прайса магазином
 
-    Обновление прайса магазином
+    Обновление прайса магазином. Импорт ставится в очередь и выполняется
+    обработчиком run_import_worker, в ответе возвращается номер задачи.
+    Формат прайса (yaml, json, ndjson, csv) передается в поле format либо
+    определяется по типу содержимого или расширению файла. При dry_run=true
+    прайс только проверяется, отчет об ошибках возвращается в статусе задачи.
     """
 
     permission_classes = (permissions.IsAuthenticated,)
@@ -476,37 +813,52 @@ class PartnerUpdate(APIView):
             except ValidationError as e:
                 return JsonResponse({'Status': False, 'Error': str(e)})
             else:
-                stream = get(url).content
-
-                data = load_yaml(stream, Loader=Loader)
-
-                shop, _ = Shop.objects.get_or_create(name=data['shop'], user_id=request.user.id)
-                for category in data['categories']:
-                    category_object, _ = Category.objects.get_or_create(id=category['id'], name=category['name'])
-                    category_object.shops.add(shop.id)
-                    category_object.save()
-                ProductInfo.objects.filter(shop_id=shop.id).delete()
-                for item in data['goods']:
-                    product, _ = Product.objects.get_or_create(name=item['name'], category_id=item['category'])
-
-                    product_info = ProductInfo.objects.create(product_id=product.id,
-                                                              external_id=item['id'],
-                                                              model=item['model'],
-                                                              price=item['price'],
-                                                              price_rrc=item['price_rrc'],
-                                                              quantity=item['quantity'],
-                                                              shop_id=shop.id)
-                    for name, value in item['parameters'].items():
-                        parameter_object, _ = Parameter.objects.get_or_create(name=name)
-                        ProductParameter.objects.create(product_info_id=product_info.id,
-                                                        parameter_id=parameter_object.id,
-                                                        value=value)
-
-                return JsonResponse({'Status': True})
+                price_list_format = request.data.get('format', '')
+                if price_list_format and price_list_format not in dict(PRICE_LIST_FORMAT_CHOICES):
+                    return JsonResponse({'Status': False, 'Error': 'Неизвестный формат прайса'})
+
+                job = ImportJob.objects.create(user_id=request.user.id, url=url, format=price_list_format,
+                                               dry_run=str(request.data.get('dry_run', '')).lower() in ('1', 'true'))
+
+                return JsonResponse({'Status': True, 'Job': job.id}, status=202)
 
         return JsonResponse({'Status': False, 'Errors': 'Не указаны все необходимые аргументы'})
 
 
+class PartnerUpdateStatus(RetrieveAPIView):
+    """
+    Ход выполнения задачи импорта
+
+    Ход выполнения задачи импорта: этап, количество обработанных товаров и скорость
+    """
+    serializer_class = ImportJobSerializer
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get_queryset(self):
+        return ImportJob.objects.filter(user_id=self.request.user.id)
+
+
+class PartnerUpdateMetrics(APIView):
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request, *args, **kwargs):
+        """
+        Метрики загрузки прайсов
+
+        Метрики загрузки прайсов по ссылкам: количество загрузок, объем,
+        среднее время и доля запросов, выполненных по соединению из пула
+        """
+        metrics = ImportJob.objects.filter(fetch_time__isnull=False).aggregate(
+            fetches=Count('id'),
+            bytes=Sum('bytes_fetched'),
+            avg_latency=Avg('fetch_time'),
+            max_latency=Max('fetch_time'),
+            reused=Count('id', filter=Q(connection_reused=True)),
+        )
+        metrics['reuse_ratio'] = round(metrics['reused'] / metrics['fetches'], 3) if metrics['fetches'] else None
+        return JsonResponse(metrics)
+
+
 class PartnerView(APIView):
 
     def get(self, request, *args, **kwags):
@@ -536,13 +888,15 @@ class PartnerView(APIView):
         return JsonResponse({'Status': True})
 
 
-class GetOrdersView(ListAPIView):
+class GetOrdersView(ValuesListMixin, ListAPIView):
     """
     Получить список заказов для доставки
     """
     queryset = Order.objects.filter(state='new')
     serializer_class = OrderSerializer
+    values_serializer_class = OrderValuesSerializer
     permission_classes = (permissions.IsAuthenticated,)
+    pagination_class = OrderCursorPagination
 
 
 ##########
@@ -130,5 +130,49 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.BasicAuthentication',
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.TokenAuthentication',
-    ]
-}
\ No newline at end of file
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'app.pagination.CatalogPageNumberPagination',
+}
+# Загрузка прайсов по ссылке: тайм-ауты (сек), общий лимит времени и размера
+PRICE_LIST_CONNECT_TIMEOUT = 5
+PRICE_LIST_READ_TIMEOUT = 30
+PRICE_LIST_FETCH_DEADLINE = 600
+PRICE_LIST_MAX_SIZE = 200 * 1024 * 1024
+
+# Импорт магазина без общей транзакции занимает магазин: блокировка продлевается каждым пакетом
+# и считается брошенной, если не продлевалась столько секунд
+IMPORT_SHOP_LEASE = 10 * 60
+
+# Размер общего для процесса кэша id категорий, товаров и параметров при импорте (0 - отключен)
+IMPORT_LOOKUP_CACHE_SIZE = 0
+
+# Кэш сводок корзин (алиас BASKET_SUMMARY_CACHE): memcached, общий для процессов сервера,
+# адрес - переменная окружения BASKET_CACHE_LOCATION (host:port). Без нее - память процесса,
+# что подходит только для разработки с одним процессом
+BASKET_SUMMARY_CACHE = 'basket'
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    BASKET_SUMMARY_CACHE: {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': os.environ['BASKET_CACHE_LOCATION'],
+        'KEY_PREFIX': 'basket',
+    } if os.environ.get('BASKET_CACHE_LOCATION') else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'basket',
+    },
+}
+
+# Максимальное количество предложений, по которым фасеты поиска с фильтрами по тексту, цене и параметрам
+# считаются на лету; для более широкой выборки используется индекс ParameterFacet
+FACET_LIVE_LIMIT = 5000
+
+# Время хранения сводки корзины (количество и сумма) в кэше, сек
+BASKET_SUMMARY_TIMEOUT = 300
+
+# Сколько хранится ответ на запрос с заголовком Idempotency-Key, сек
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+# Через сколько секунд незавершенный запрос с Idempotency-Key (например, после падения
+# обработчика) уступает ключ повтору; должно превышать время обработки запроса
+IDEMPOTENCY_KEY_LEASE = 60